@@ -0,0 +1,133 @@
+import asyncio
+import hashlib
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import List, Iterator
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from services.embedding_backends import EmbeddingBackend
+from services.tokenizer import count_tokens
+
+_WORD = re.compile(r"\w+")
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic hashed bag-of-words embeddings with configurable latency"""
+
+    def __init__(self, dimensions: int = 384, call_latency: float = 0.0, text_latency: float = 0.0):
+        self.dimensions = dimensions
+        self.call_latency = call_latency
+        self.text_latency = text_latency
+        self.calls = 0
+        self.texts = 0
+        self._lock = threading.Lock()
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in _WORD.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def _wait(self, count: int):
+        with self._lock:
+            self.calls += 1
+            self.texts += count
+        time.sleep(self.call_latency + self.text_latency * count)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._wait(len(texts))
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self._wait(1)
+        return self._embed(text)
+
+
+class FakeEmbeddingBackend(EmbeddingBackend):
+    """Backend local simulado; `remote=True` lo hace pasar por el EmbeddingScheduler"""
+
+    def __init__(self, embeddings: FakeEmbeddings, remote: bool = False):
+        self.model_name = f"fake-embedding-{embeddings.dimensions}"
+        self.remote = remote
+        self.embeddings = embeddings
+
+    def get_embeddings(self) -> Embeddings:
+        return self.embeddings
+
+
+class FakeChatModel:
+    """Deterministic stand-in for ChatGoogleGenerativeAI (invoke, stream, ainvoke).
+
+    With `rate_limit_probability` a fraction of the calls fail like a Gemini 429,
+    to exercise the gateway's backoff.
+    """
+
+    model = "fake-llm"
+
+    def __init__(self, first_token_latency: float = 0.0, tokens_per_second: float = 0.0,
+                 answer_tokens: int = 120, rate_limit_probability: float = 0.0, seed: int = 0):
+        self.first_token_latency = first_token_latency
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.rate_limit_probability = rate_limit_probability
+        self.prompt_tokens: List[int] = []
+        self.call_seconds: List[float] = []
+        self.rate_limited = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _maybe_rate_limit(self):
+        with self._lock:
+            if self._random.random() >= self.rate_limit_probability:
+                return
+            self.rate_limited += 1
+        raise Exception("429 Resource has been exhausted (e.g. check quota).")
+
+    def _answer_words(self, prompt: str) -> List[str]:
+        rng = random.Random(hashlib.sha256(prompt.encode()).hexdigest())
+        words = _WORD.findall(prompt[-4000:]) or ["respuesta"]
+        return [rng.choice(words) for _ in range(self.answer_tokens)]
+
+    def _record(self, prompt: str, seconds: float):
+        with self._lock:
+            self.prompt_tokens.append(count_tokens(prompt))
+            self.call_seconds.append(seconds)
+
+    def _generation_seconds(self) -> float:
+        if not self.tokens_per_second:
+            return 0.0
+        return self.answer_tokens / self.tokens_per_second
+
+    def invoke(self, prompt: str):
+        self._maybe_rate_limit()
+        start = time.perf_counter()
+        time.sleep(self.first_token_latency + self._generation_seconds())
+        content = " ".join(self._answer_words(prompt))
+        self._record(prompt, time.perf_counter() - start)
+        return SimpleNamespace(content=content)
+
+    def stream(self, prompt: str) -> Iterator[SimpleNamespace]:
+        self._maybe_rate_limit()
+        start = time.perf_counter()
+        time.sleep(self.first_token_latency)
+        delay = 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+        for word in self._answer_words(prompt):
+            time.sleep(delay)
+            yield SimpleNamespace(content=f"{word} ")
+        self._record(prompt, time.perf_counter() - start)
+
+    async def ainvoke(self, prompt: str):
+        self._maybe_rate_limit()
+        start = time.perf_counter()
+        await asyncio.sleep(self.first_token_latency + self._generation_seconds())
+        content = " ".join(self._answer_words(prompt))
+        self._record(prompt, time.perf_counter() - start)
+        return SimpleNamespace(content=content)
@@ -0,0 +1,247 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Metrics shown when comparing against a baseline run: (path, higher_is_better)
+KEY_METRICS = [
+    ("ingest.pages_per_second", True),
+    ("ingest.chunks_per_second", True),
+    ("ingest.seconds", False),
+    ("questions.latency.p50", False),
+    ("questions.latency.p95", False),
+    ("questions.prompt_tokens.mean", False),
+    ("peak_rss_mb.self", False),
+]
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    array = np.asarray(values, dtype=np.float64)
+    return {
+        "count": len(values),
+        "mean": float(array.mean()),
+        "p50": float(np.percentile(array, 50)),
+        "p95": float(np.percentile(array, 95)),
+        "p99": float(np.percentile(array, 99)),
+        "max": float(array.max()),
+    }
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale,
+    }
+
+
+class StageSamples:
+    """Raw stage_duration_seconds observations per stage (the registry only keeps histogram buckets)"""
+
+    def __init__(self, metrics):
+        self.samples: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+        observe = metrics.observe
+
+        def record(name, value, *args, **labels):
+            if name == "stage_duration_seconds":
+                stage = labels.get("stage")
+                if "operation" in labels:
+                    stage = f"{stage}:{labels['operation']}"
+                with self._lock:
+                    self.samples.setdefault(stage, []).append(value)
+            observe(name, value, *args, **labels)
+
+        # Spans and timed() record through the instance attribute
+        metrics.observe = record
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """Percentiles per stage of the samples recorded since the last report"""
+        with self._lock:
+            samples, self.samples = self.samples, {}
+        return {stage: percentiles(values) for stage, values in sorted(samples.items())}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def _lookup(results: Dict[str, Any], path: str) -> Optional[float]:
+    value = results
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]):
+    """Print the change of the key metrics against a baseline run"""
+    print(f"\nComparación con {baseline.get('git_commit')} ({baseline.get('timestamp')}):")
+    for path, higher_is_better in KEY_METRICS:
+        current, previous = _lookup(results, path), _lookup(baseline, path)
+        if current is None or previous is None:
+            continue
+        change = (current - previous) / previous * 100 if previous else 0.0
+        better = (change > 0) == higher_is_better or change == 0
+        print(f"  {path:32s} {previous:12.3f} -> {current:12.3f}  ({change:+.1f}% {'✓' if better else '✗'})")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline de ingesta y preguntas con LLM y embeddings simulados")
+    parser.add_argument("--files", type=int, default=3, help="número de PDFs sintéticos")
+    parser.add_argument("--pages", type=int, default=20, help="páginas por PDF")
+    parser.add_argument("--questions", type=int, default=20, help="preguntas a ask_question")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--embed-call-latency", type=float, default=0.05, help="segundos por llamada de embeddings")
+    parser.add_argument("--embed-text-latency", type=float, default=0.001, help="segundos por texto embebido")
+    parser.add_argument("--embed-remote", action="store_true", help="pasar los embeddings por el EmbeddingScheduler")
+    parser.add_argument("--llm-first-token", type=float, default=0.3, help="latencia del primer token del LLM")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--llm-answer-tokens", type=int, default=120)
+    parser.add_argument("--llm-429-rate", type=float, default=0.0, help="fracción de llamadas al LLM que fallan con 429")
+    parser.add_argument("--llm-rpm", type=float, default=100000.0, help="límite de peticiones por minuto del LLMGateway")
+    parser.add_argument("--answer-cache", action="store_true", help="mantener activa la cache semántica de respuestas")
+    parser.add_argument("--conversation", action="store_true",
+                        help="hacer las preguntas como una sola conversación (con memoria) en lugar de independientes")
+    parser.add_argument("--output", help="ruta del JSON de resultados (por defecto benchmarks/results/)")
+    parser.add_argument("--baseline", help="JSON de una ejecución anterior para comparar")
+    parser.add_argument("--keep-data", action="store_true", help="no borrar el directorio de datos temporal")
+    return parser.parse_args(argv)
+
+
+def run(args, data_dir: str) -> Dict[str, Any]:
+    # Services read their configuration at import time, so the sandbox is set up first
+    os.environ["DATA_DIR"] = data_dir
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(data_dir, "embedding_cache.sqlite3")
+    os.environ["GOOGLE_API_KEY"] = "benchmark"
+    os.environ["LLM_REQUESTS_PER_MINUTE"] = str(args.llm_rpm)
+    if not args.answer_cache:
+        os.environ["ANSWER_CACHE_THRESHOLD"] = "2"
+
+    from benchmarks.fakes import FakeEmbeddings, FakeEmbeddingBackend, FakeChatModel
+    from benchmarks.synthetic import generate_corpus, generate_questions
+    from services.document_processor import DocumentProcessor
+    from services.conversation_manager import ConversationManager
+    from services.metrics import get_metrics
+
+    embeddings = FakeEmbeddings(call_latency=args.embed_call_latency, text_latency=args.embed_text_latency)
+    backend = FakeEmbeddingBackend(embeddings, remote=args.embed_remote)
+    ingest_llm = FakeChatModel(args.llm_first_token, args.llm_tokens_per_second, args.llm_answer_tokens,
+                               args.llm_429_rate, args.seed)
+    chat_llm = FakeChatModel(args.llm_first_token, args.llm_tokens_per_second, args.llm_answer_tokens,
+                             args.llm_429_rate, args.seed + 1)
+
+    uploads = generate_corpus(args.files, args.pages, args.seed)
+    questions = generate_questions(args.questions, args.seed)
+
+    processor = DocumentProcessor(embedding_backend=backend, llm=ingest_llm)
+    stages = StageSamples(get_metrics())
+    start = time.perf_counter()
+    results = processor.process_pdfs(uploads)
+    ingest_seconds = time.perf_counter() - start
+
+    # Built before the summaries finish, like the app does when a job completes
+    manager = ConversationManager(
+        vector_store=results['vector_store'],
+        sources=results['sources'],
+        corpus_fingerprint=results['corpus_fingerprint'],
+        lexical_index=results['lexical_index'],
+        document_summaries=results['document_summaries'],
+        llm=chat_llm,
+        indexed_files=results['indexed_files']
+    )
+    # Summaries run in the background once the corpus is usable; questions are asked with them ready
+    processor.wait_for_summaries()
+    summary_seconds = time.perf_counter() - start - ingest_seconds
+    if set(manager.document_summaries) != set(results['document_summaries']):
+        raise RuntimeError("Background summaries are not visible to the ConversationManager")
+
+    pages = sum(summary['pages'] for summary in results['file_summaries'].values())
+    chunks = results['total_documents']
+    ingest_stages = stages.report()
+    print(f"Ingesta: {pages} páginas, {chunks} fragmentos en {ingest_seconds:.2f}s (+{summary_seconds:.2f}s de resúmenes)")
+
+    latencies = []
+    for question in questions:
+        if not args.conversation:
+            manager.memory.clear()
+        start = time.perf_counter()
+        manager.ask_question(question)
+        latencies.append(time.perf_counter() - start)
+    print(f"Preguntas: {len(questions)} en {sum(latencies):.2f}s")
+
+    return {
+        "ingest": {
+            "files": args.files,
+            "pages": pages,
+            "chunks": chunks,
+            "seconds": ingest_seconds,
+            "pages_per_second": pages / ingest_seconds if ingest_seconds else 0.0,
+            "chunks_per_second": chunks / ingest_seconds if ingest_seconds else 0.0,
+            "summary_seconds": summary_seconds,
+            "stages": ingest_stages,
+            "summary_prompt_tokens": percentiles(ingest_llm.prompt_tokens),
+        },
+        "questions": {
+            "count": len(questions),
+            "latency": percentiles(latencies),
+            "llm_latency": percentiles(chat_llm.call_seconds),
+            "prompt_tokens": percentiles(chat_llm.prompt_tokens),
+            "stages": stages.report(),
+            "answer_cache": manager.answer_cache.stats(),
+            "rate_limited": chat_llm.rate_limited,
+        },
+        "embedder": {"calls": embeddings.calls, "texts": embeddings.texts},
+        "metrics": get_metrics().snapshot(),
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    data_dir = tempfile.mkdtemp(prefix="catchai-bench-")
+    try:
+        results = run(args, data_dir)
+    finally:
+        if not args.keep_data:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": vars(args),
+        **results,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"benchmark_{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            compare(results, json.load(f))
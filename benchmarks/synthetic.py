@@ -0,0 +1,116 @@
+import io
+import random
+import textwrap
+from typing import List
+
+WORDS = (
+    "analisis riesgo proyecto equipo cliente contrato servicio calidad proceso gestion "
+    "informe resultado objetivo estrategia mercado inversion presupuesto plazo entrega "
+    "experiencia formacion universidad ingenieria desarrollo software datos modelo sistema "
+    "horario turno reunion semana lunes martes miercoles jueves viernes evaluacion control "
+    "impacto probabilidad mitigacion responsable seguimiento auditoria norma politica"
+).split()
+NAMES = "Ana Lopez|Carlos Rojas|Maria Soto|Diego Fuentes|Lucia Vega|Pedro Araya".split("|")
+
+LINE_WIDTH = 90
+LINES_PER_PAGE = 55
+
+
+def make_pdf(pages: List[str]) -> bytes:
+    """Build a minimal text-only PDF with one Helvetica page per string"""
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    content_ids, page_ids = [], []
+    for text in pages:
+        lines = b" ".join(
+            b"(" + line.encode("latin-1").replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b") '"
+            for line in text.split("\n")
+        )
+        stream = b"BT /F1 10 Tf 50 750 Td 12 TL " + lines + b" ET"
+        content_ids.append(add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"))
+        page_ids.append(add(None))
+
+    pages_id = add(None)
+    for content_id, page_id in zip(content_ids, page_ids):
+        objects[page_id - 1] = (
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font, content_id)
+        )
+    objects[pages_id - 1] = (
+        b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+        + b"] /Count %d >>" % len(page_ids)
+    )
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    return bytes(out)
+
+
+def _sentence(rng: random.Random) -> str:
+    words = rng.choices(WORDS, k=rng.randint(8, 18))
+    if rng.random() < 0.3:
+        words.insert(rng.randrange(len(words)), f"RX-{rng.randint(100, 999)}")
+    if rng.random() < 0.2:
+        words.insert(rng.randrange(len(words)), rng.choice(NAMES))
+    if rng.random() < 0.2:
+        words.append(f"{rng.randint(1, 100)}%")
+    return " ".join(words).capitalize() + "."
+
+
+def _page(rng: random.Random) -> str:
+    lines = []
+    while len(lines) < LINES_PER_PAGE - 6:
+        paragraph = " ".join(_sentence(rng) for _ in range(rng.randint(2, 6)))
+        lines.extend(textwrap.wrap(paragraph, LINE_WIDTH))
+        lines.append("")
+    return "\n".join(lines[:LINES_PER_PAGE])
+
+
+class SyntheticUpload(io.BytesIO):
+    """Stand-in for Streamlit's UploadedFile: a BytesIO with name and size"""
+
+    def __init__(self, name: str, data: bytes):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+
+def generate_corpus(files: int, pages: int, seed: int = 0) -> List[SyntheticUpload]:
+    """Deterministic corpus of `files` PDFs with `pages` pages each"""
+    rng = random.Random(seed)
+    return [
+        SyntheticUpload(f"documento_{i + 1:02d}.pdf", make_pdf([_page(rng) for _ in range(pages)]))
+        for i in range(files)
+    ]
+
+
+def generate_questions(count: int, seed: int = 0) -> List[str]:
+    """Deterministic questions mixing topics, names and identifiers"""
+    rng = random.Random(seed + 1)
+    templates = [
+        "¿Qué dicen los documentos sobre {word} y {other}?",
+        "¿Qué se menciona del identificador RX-{number}?",
+        "¿Cuál es el rol de {name} en los documentos?",
+        "Resume la información sobre {word} en cada documento",
+    ]
+    return [
+        rng.choice(templates).format(
+            word=rng.choice(WORDS), other=rng.choice(WORDS),
+            number=rng.randint(100, 999), name=rng.choice(NAMES)
+        )
+        for _ in range(count)
+    ]
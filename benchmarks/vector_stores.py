@@ -0,0 +1,191 @@
+"""Latency, memory and recall of the vector store backends on synthetic embeddings.
+
+    python -m benchmarks.vector_stores --chunks 20000 --sources 10
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+from typing import List, Dict, Any, Callable
+
+import numpy as np
+
+from benchmarks.run import RESULTS_DIR, percentiles, git_commit
+
+BACKENDS = ["chroma", "flat:float32", "flat:float16", "flat:int8"]
+
+
+def current_rss_mb() -> float:
+    """Resident set size right now (ru_maxrss only reports the peak)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return float("nan")
+
+
+def directory_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / (1024 * 1024)
+
+
+def synthetic_embeddings(count: int, dimensions: int, topics: int, seed: int) -> np.ndarray:
+    """Unit vectors scattered around a few topic centroids, closer to real text embeddings than pure noise"""
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((topics, dimensions)).astype(np.float32)
+    vectors = centroids[rng.integers(0, topics, count)] + 0.8 * rng.standard_normal((count, dimensions)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def open_backend(backend: str, path: str):
+    from services.vector_stores import ChromaVectorStore, FlatVectorStore
+    if backend == "chroma":
+        return ChromaVectorStore(embedding_function=None, persist_directory=path)
+    return FlatVectorStore(None, path, dtype=backend.split(":", 1)[1])
+
+
+def exact_top_k(vectors: np.ndarray, query: np.ndarray, rows: np.ndarray, k: int) -> List[int]:
+    scores = vectors[rows] @ query
+    return [int(rows[i]) for i in np.argsort(-scores)[:k]]
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> List[float]:
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_backend(backend: str, args, vectors: np.ndarray, queries: np.ndarray, sources: List[str],
+                  data_dir: str) -> Dict[str, Any]:
+    path = os.path.join(data_dir, backend.replace(":", "_"))
+    ids = [f"chunk-{i}" for i in range(len(vectors))]
+    metadatas = [{"source": sources[i % len(sources)], "chunk_id": ids[i]} for i in range(len(vectors))]
+    documents = [f"fragmento {i}" for i in range(len(vectors))]
+    rows_by_source = {
+        source: np.arange(index, len(vectors), len(sources)) for index, source in enumerate(sources)
+    }
+
+    gc.collect()
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    store = open_backend(backend, path)
+    for begin in range(0, len(vectors), args.batch):
+        end = begin + args.batch
+        store.upsert_embeddings(ids[begin:end], vectors[begin:end].tolist(), metadatas[begin:end], documents[begin:end])
+    store.save()
+    build_seconds = time.perf_counter() - start
+
+    # Reopen so the flat backends are measured the way sessions use them (float32 memory-mapped)
+    del store
+    gc.collect()
+    store = open_backend(backend, path)
+    rss_after = current_rss_mb()
+
+    global_latencies, grouped_latencies = [], []
+    hits = total = 0
+    for query in queries:
+        embedding = query.tolist()
+        global_latencies += measure(
+            lambda: store.similarity_search_by_vector_with_relevance_scores(embedding, k=args.k), args.repeat
+        )
+        if hasattr(store, "grouped_search"):
+            grouped_latencies += measure(
+                lambda: store.grouped_search(embedding, k=args.k, sources=sources), args.repeat
+            )
+            grouped = store.grouped_search(embedding, k=args.k, sources=sources)
+            found = {source: [doc.metadata["chunk_id"] for doc, _ in results] for source, results in grouped.items()}
+        else:
+            grouped_latencies += measure(
+                lambda: [store.similarity_search_by_vector(embedding, k=args.k, filter={"source": source})
+                         for source in sources],
+                args.repeat
+            )
+            found = {
+                source: [doc.metadata["chunk_id"]
+                         for doc in store.similarity_search_by_vector(embedding, k=args.k, filter={"source": source})]
+                for source in sources
+            }
+        for source, rows in rows_by_source.items():
+            expected = {ids[row] for row in exact_top_k(vectors, query, rows, args.k)}
+            hits += len(expected & set(found.get(source, [])))
+            total += len(expected)
+
+    result = {
+        "build_seconds": build_seconds,
+        "global_latency": percentiles(global_latencies),
+        "per_source_latency": percentiles(grouped_latencies),
+        "per_source_recall": hits / total if total else 0.0,
+        "rss_delta_mb": rss_after - rss_before,
+        "disk_mb": directory_mb(path),
+    }
+    del store
+    gc.collect()
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compara los backends de vector store: latencia, memoria y recall")
+    parser.add_argument("--chunks", type=int, default=20000, help="fragmentos indexados")
+    parser.add_argument("--sources", type=int, default=10, help="documentos (fuentes) entre los que se reparten")
+    parser.add_argument("--dimensions", type=int, default=768, help="dimensión de los embeddings")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3, help="repeticiones por consulta")
+    parser.add_argument("--k", type=int, default=3, help="fragmentos por documento")
+    parser.add_argument("--batch", type=int, default=1000, help="fragmentos por upsert")
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="ruta del JSON de resultados (por defecto benchmarks/results/)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    vectors = synthetic_embeddings(args.chunks, args.dimensions, topics=max(args.sources * 4, 8), seed=args.seed)
+    queries = synthetic_embeddings(args.queries, args.dimensions, topics=max(args.sources * 4, 8), seed=args.seed)
+    sources = [f"documento_{i:03d}.pdf" for i in range(args.sources)]
+
+    data_dir = tempfile.mkdtemp(prefix="catchai-vectors-")
+    backends = {}
+    try:
+        for backend in args.backends:
+            try:
+                backends[backend] = bench_backend(backend, args, vectors, queries, sources, data_dir)
+            except ImportError as e:
+                print(f"{backend}: omitido ({e})")
+                continue
+            result = backends[backend]
+            print(
+                f"{backend:14s} p50 global {result['global_latency']['p50'] * 1000:8.2f} ms  "
+                f"p50 por documento {result['per_source_latency']['p50'] * 1000:8.2f} ms  "
+                f"recall {result['per_source_recall']:.3f}  "
+                f"RSS {result['rss_delta_mb']:8.1f} MB  disco {result['disk_mb']:8.1f} MB"
+            )
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": vars(args),
+        "backends": backends,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"vector_stores_{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,10 @@
 import streamlit as st
 
+# Mensajes mostrados al abrir el chat y añadidos por cada "Mostrar anteriores"
+CHAT_PAGE_MESSAGES = 20
+# Respuestas más recientes que muestran sus fuentes sin pedirlo
+CHAT_EXPANDED_TURNS = 3
+
 def render_chat_interface():
     """Renderiza la interfaz de chat"""
     st.markdown("""
@@ -64,8 +69,7 @@ def render_chat_interface():
     </div>
     """, unsafe_allow_html=True)
     
-    for message in st.session_state.chat_history:
-        render_message(message)
+    render_chat_history()
     
     with st.form("chat_form", clear_on_submit=True):
         col1, col2 = st.columns([4, 1])
@@ -85,7 +89,46 @@ def render_chat_interface():
     
     render_suggested_questions()
 
-def render_message(message):
+def render_chat_history():
+    """Renderiza solo la ventana más reciente del historial; los mensajes anteriores se cargan por páginas"""
+    history = st.session_state.chat_history
+    visible = st.session_state.get('chat_visible_messages', CHAT_PAGE_MESSAGES)
+    start = max(0, len(history) - visible)
+    
+    if start > 0:
+        if st.button(f"⬆️ Mostrar mensajes anteriores ({start} ocultos)", key="chat_show_older"):
+            st.session_state.chat_visible_messages = visible + CHAT_PAGE_MESSAGES
+            st.rerun()
+    
+    recent_answers = [i for i, message in enumerate(history) if message["role"] == "assistant"][-CHAT_EXPANDED_TURNS:]
+    expanded_from = recent_answers[0] if recent_answers else 0
+    for index in range(start, len(history)):
+        render_message(history[index], index, sources_expanded=index >= expanded_from)
+
+def render_sources(message, index, expanded):
+    """Fuentes de una respuesta, recuperadas del corpus solo cuando se muestran"""
+    refs = message.get("sources") or []
+    if not refs:
+        return
+    
+    if expanded:
+        with st.expander(f"Ver {len(refs)} fuentes", expanded=expanded):
+            render_source_list(refs)
+    # Las respuestas antiguas solo consultan el corpus si el usuario lo pide
+    elif st.toggle(f"Ver {len(refs)} fuentes", key=f"chat_sources_{index}"):
+        render_source_list(refs)
+
+def render_source_list(refs):
+    """Muestra las fuentes referenciadas, leídas del corpus activo"""
+    for i, source in enumerate(st.session_state.conversation_manager.resolve_sources(refs)):
+        st.write(f"**Fuente {i+1}:** {source.metadata.get('source_file', 'Desconocido')}")
+        st.write(f"**Página:** {source.metadata.get('page', 'N/A')}")
+        if source.metadata.get('score') is not None:
+            st.write(f"**Relevancia:** {source.metadata['score']:.4f}")
+        st.write(f"_{source.page_content[:200]}..._")
+        st.write("---")
+
+def render_message(message, index=None, sources_expanded=True):
     """Renderiza un mensaje del chat"""
     if message["role"] == "user":
         st.markdown(f"""
@@ -96,36 +139,44 @@ def render_message(message):
         """, unsafe_allow_html=True)
     
     else:
-        st.markdown(f"""
+        st.markdown(assistant_message_html(message['content']), unsafe_allow_html=True)
+        render_sources(message, index, sources_expanded)
+
+def assistant_message_html(content):
+    """HTML de un mensaje del asistente"""
+    return f"""
         <div class="assistant-message">
             <div class="message-header assistant-header">CatchAI</div>
-            <div class="message-content">{message['content']}</div>
+            <div class="message-content">{content}</div>
         </div>
-        """, unsafe_allow_html=True)
-
-        if "sources" in message and message["sources"]:
-            with st.expander("Ver fuentes", expanded=False):
-                for i, source in enumerate(message["sources"]):
-                    st.write(f"**Fuente {i+1}:** {source.metadata.get('source_file', 'Desconocido')}")
-                    st.write(f"**Página:** {source.metadata.get('page', 'N/A')}")
-                    st.write(f"_{source.page_content[:200]}..._")
-                    st.write("---")
+        """
 
 def process_question(question):
-    """Procesa una pregunta del usuario"""
+    """Procesa una pregunta del usuario mostrando la respuesta a medida que se genera"""
     st.session_state.chat_history.append({
         "role": "user",
         "content": question
     })
+    render_message(st.session_state.chat_history[-1])
     
-    with st.spinner("Pensando..."):
-        result = st.session_state.conversation_manager.ask_question(question)
-        
-        st.session_state.chat_history.append({
-            "role": "assistant",
-            "content": result["answer"],
-            "sources": result.get("source_documents", [])
-        })
+    placeholder = st.empty()
+    placeholder.markdown(assistant_message_html("<em>Pensando...</em>"), unsafe_allow_html=True)
+    
+    answer = ""
+    result = {"answer": "", "source_documents": []}
+    for event in st.session_state.conversation_manager.stream_question(question):
+        if "delta" in event:
+            answer += event["delta"]
+            placeholder.markdown(assistant_message_html(answer + "▌"), unsafe_allow_html=True)
+        if event.get("done"):
+            result = event
+    
+    # El historial guarda solo referencias (ID + puntuación), no los fragmentos
+    st.session_state.chat_history.append({
+        "role": "assistant",
+        "content": result["answer"],
+        "sources": result.get("source_refs", [])
+    })
     
     st.rerun()
 
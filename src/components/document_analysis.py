@@ -1,5 +1,6 @@
 import streamlit as st
 import pandas as pd
+from services.llm_gateway import PRIORITY_ANALYSIS
 
 def render_document_analysis():
     """Renderiza el análisis de documentos con mejor contraste visual"""
@@ -160,14 +161,17 @@ def identify_themes():
         if not hasattr(st.session_state, 'conversation_manager') or not st.session_state.conversation_manager:
             return []
             
-        result = st.session_state.conversation_manager.ask_question(theme_prompt)
-        
-        if not result or 'answer' not in result:
-            return []
+        conversation_manager = st.session_state.conversation_manager
+        answer = conversation_manager.answer_from_summaries(theme_prompt)
+        if answer is None:
+            result = conversation_manager.ask_question(theme_prompt, priority=PRIORITY_ANALYSIS)
+            if not result or 'answer' not in result:
+                return []
+            answer = result["answer"]
         
         # Parsear respuesta 
         themes = []
-        sections = result["answer"].split("---")
+        sections = answer.split("---")
         
         for section in sections:
             if "TEMA:" in section:
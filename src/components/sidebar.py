@@ -1,5 +1,6 @@
 import streamlit as st
 from services.conversation_manager import ConversationManager
+from services.ingestion_jobs import get_job_manager, ACTIVE_STATUSES, JOB_DONE, JOB_FAILED, JOB_CANCELLED
 
 def render_sidebar():
     """Renderiza la barra lateral con carga de documentos"""
@@ -110,12 +111,14 @@ def render_sidebar():
         if 'current_files' not in st.session_state:
             st.session_state.current_files = []
         
-        # Si los archivos cambiaron, limpiar estado
+        # Si los archivos cambiaron, el próximo procesamiento solo indexa la diferencia
         if st.session_state.current_files != current_file_names:
             if st.session_state.current_files:  # Solo si había archivos anteriores
-                st.sidebar.info("🔄 Archivos cambiados - Estado limpiado")
-                reset_system()
+                st.session_state.files_changed = True
             st.session_state.current_files = current_file_names
+        
+        if st.session_state.get('files_changed') and st.session_state.documents_processed:
+            st.sidebar.info("🔄 Archivos cambiados - Procesa para actualizar el índice")
     
     if uploaded_files:
         if len(uploaded_files) > 5:
@@ -126,16 +129,19 @@ def render_sidebar():
         st.sidebar.write("**Archivos seleccionados:**")
         total_size = 0
         for file in uploaded_files:
-            size_mb = len(file.getvalue()) / (1024 * 1024)
+            size_mb = file.size / (1024 * 1024)
             total_size += size_mb
             st.sidebar.write(f"• {file.name} ({size_mb:.1f} MB)")
         
         st.sidebar.write(f"**Tamaño total:** {total_size:.1f} MB")
         
         # Botón de procesamiento
-        if st.sidebar.button("🚀 Procesar Documentos", type="primary"):
+        if st.sidebar.button("🚀 Procesar Documentos", type="primary", disabled=ingestion_active()):
             process_documents(uploaded_files)
     
+    render_ingestion_status()
+    render_saved_corpora()
+    
     st.sidebar.markdown("---")
     
     st.sidebar.markdown("""
@@ -150,40 +156,172 @@ def render_sidebar():
             results = st.session_state.processing_results
             st.sidebar.write(f"📄 {results['total_documents']} chunks creados")
             st.sidebar.write(f"📁 {len(results['file_summaries'])} archivos")
+            for duplicate, original in results.get('duplicate_files', []):
+                st.sidebar.warning(f"⚠️ {duplicate} tiene el mismo contenido que {original}; se indexó una sola vez")
+            summarized = len(results['document_summaries'])
+            if summarized < len(results['file_summaries']):
+                # Los resúmenes se generan en segundo plano; mientras tanto se usa la búsqueda
+                st.sidebar.caption(f"📝 Resúmenes listos: {summarized}/{len(results['file_summaries'])}")
     else:
         st.sidebar.info("⏳ Esperando documentos...")
     
     if st.sidebar.button("🔄 Reiniciar Sistema", help="Limpia todos los datos"):
         reset_system()
 
+STAGE_LABELS = {
+    "extract": "Extracción",
+    "split": "División",
+    "embed": "Embeddings",
+    "persist": "Persistencia"
+}
+
+def get_ingestion_job():
+    """Devuelve el trabajo de ingesta de la sesión (también tras recargar la página)"""
+    job_id = st.session_state.get('ingestion_job_id')
+    if not job_id:
+        job_id = st.experimental_get_query_params().get('job', [None])[0]
+        st.session_state.ingestion_job_id = job_id
+    if not job_id:
+        return None
+    
+    job = get_job_manager().get(job_id)
+    if job is None:
+        clear_ingestion_job()
+    return job
+
+def set_query_param(name, value):
+    """Actualiza (o elimina, con None) un parámetro de la URL conservando los demás"""
+    params = st.experimental_get_query_params()
+    if value is None:
+        params.pop(name, None)
+    else:
+        params[name] = value
+    st.experimental_set_query_params(**params)
+
+def clear_ingestion_job():
+    st.session_state.ingestion_job_id = None
+    set_query_param('job', None)
+
+def ingestion_active():
+    job = get_ingestion_job()
+    return job is not None and job.status in ACTIVE_STATUSES
+
 def process_documents(uploaded_files):
-    """Procesa los documentos subidos"""
-    try:
-        with st.spinner("Procesando documentos..."):
-            # Procesar documentos
-            results = st.session_state.document_processor.process_pdfs(uploaded_files)
-            
-            # Actualizar conversation manager
-            st.session_state.conversation_manager = ConversationManager(
-                vector_store=results['vector_store']
-            )
-            
-            # Actualizar estado
-            st.session_state.documents_processed = True
-            st.session_state.processing_results = results
-            st.session_state.chat_history = []
-            
-            st.success(f"✅ {len(uploaded_files)} documentos procesados correctamente!")
+    """Encola el procesamiento de los documentos subidos en segundo plano"""
+    job_id = get_job_manager().submit(st.session_state.document_processor, uploaded_files)
+    st.session_state.ingestion_job_id = job_id
+    set_query_param('job', job_id)
+    st.rerun()
+
+def render_ingestion_status():
+    """Muestra el progreso del trabajo de ingesta y lo finaliza al terminar"""
+    st.session_state.ingestion_polling = False
+    job = get_ingestion_job()
+    if job is None:
+        return
+    
+    status = job.snapshot()
+    
+    if status['status'] == JOB_DONE:
+        finish_ingestion_job(job)
+    elif status['status'] in ACTIVE_STATUSES:
+        st.sidebar.write(f"**⏳ Procesando documentos...** {status['message']}")
+        for stage, label in STAGE_LABELS.items():
+            st.sidebar.progress(status['progress'][stage], text=label)
+        if st.sidebar.button("⏹️ Cancelar", key="cancel_ingestion"):
+            get_job_manager().cancel(job.id)
+        # main() vuelve a ejecutar el script para refrescar el progreso
+        st.session_state.ingestion_polling = True
+    elif status['status'] == JOB_FAILED:
+        st.sidebar.error(f"❌ Error al procesar documentos: {status['error']}")
+        st.sidebar.info("Verifica que tu GOOGLE_API_KEY tenga permisos para embeddings")
+        if st.sidebar.button("🔁 Reintentar", key="resume_ingestion"):
+            get_job_manager().resume(job.id)
+            st.rerun()
+    elif status['status'] == JOB_CANCELLED:
+        st.sidebar.warning("⏹️ Procesamiento cancelado")
+        if st.sidebar.button("▶️ Reanudar", key="resume_ingestion"):
+            get_job_manager().resume(job.id)
             st.rerun()
-            
-    except Exception as e:
-        st.error(f"❌ Error al procesar documentos: {str(e)}")
+
+def finish_ingestion_job(job):
+    """Activa el corpus procesado por un trabajo terminado"""
+    # El procesador del trabajo conserva el índice incremental, incluso si la sesión se recargó
+    st.session_state.document_processor = job.processor
+    activate_corpus(job.result)
+    clear_ingestion_job()
+    
+    st.success(f"✅ {len(job.file_names)} documentos procesados correctamente!")
+    st.rerun()
+
+def activate_corpus(results):
+    """Crea el gestor de conversación para un corpus procesado o restaurado"""
+    st.session_state.conversation_manager = ConversationManager(
+        vector_store=results['vector_store'],
+        sources=results['sources'],
+        corpus_fingerprint=results['corpus_fingerprint'],
+        lexical_index=results['lexical_index'],
+        document_summaries=results['document_summaries'],
+        indexed_files=results['indexed_files']
+    )
+    
+    st.session_state.documents_processed = True
+    st.session_state.processing_results = results
+    st.session_state.files_changed = False
+    st.session_state.chat_history = []
+    if results['corpus_fingerprint'] not in st.session_state.session_corpora:
+        st.session_state.session_corpora.append(results['corpus_fingerprint'])
+    # Con la huella en la URL, una sesión nueva se vuelve a conectar al corpus sin reprocesarlo
+    set_query_param('corpus', results['corpus_fingerprint'])
+
+def restore_corpus(fingerprint):
+    """Reabre un corpus guardado por su huella; devuelve False si ya no está disponible"""
+    results = st.session_state.document_processor.restore_corpus(fingerprint)
+    if results is None:
+        set_query_param('corpus', None)
+        return False
+    activate_corpus(results)
+    return True
+
+def render_saved_corpora():
+    """Lista los corpus procesados en esta sesión y permite reabrirlos sin volver a subir los archivos.
+    
+    Otros corpus solo se reabren con su huella en ?corpus=, que funciona como enlace privado.
+    """
+    if ingestion_active():
+        return
+    
+    fingerprint = st.experimental_get_query_params().get('corpus', [None])[0]
+    if fingerprint and not st.session_state.documents_processed:
+        if restore_corpus(fingerprint):
+            st.rerun()
+    
+    current = (st.session_state.processing_results or {}).get('corpus_fingerprint')
+    corpora = [
+        corpus for corpus in st.session_state.document_processor.saved_corpora(st.session_state.session_corpora)
+        if corpus['fingerprint'] != current
+    ]
+    if not corpora:
+        return
+    
+    with st.sidebar.expander(f"💾 Corpus guardados ({len(corpora)})"):
+        for corpus in corpora:
+            st.write(f"**{', '.join(corpus['names'])}** · {corpus['chunks']} chunks")
+            if st.button("📂 Restaurar", key=f"restore_{corpus['fingerprint']}"):
+                if restore_corpus(corpus['fingerprint']):
+                    st.rerun()
+                st.warning("El corpus ya no está disponible")
 
 def reset_system():
     """Reinicia el sistema"""
+    job = get_ingestion_job()
+    if job is not None:
+        get_job_manager().cancel(job.id)
+        clear_ingestion_job()
     st.session_state.documents_processed = False
     st.session_state.chat_history = []
     st.session_state.processing_results = None
     st.session_state.current_files = []
     st.session_state.conversation_manager = ConversationManager()
+    set_query_param('corpus', None)
     st.rerun()
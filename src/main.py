@@ -2,6 +2,8 @@ import streamlit as st
 import os
 from dotenv import load_dotenv
 import sys
+import time
+load_dotenv()
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from services.document_processor import DocumentProcessor
@@ -10,7 +12,7 @@ from components.sidebar import render_sidebar
 from components.chat_interface import render_chat_interface
 from components.document_analysis import render_document_analysis
 
-load_dotenv()
+INGESTION_POLL_SECONDS = 1.0
 
 st.set_page_config(
     page_title="CatchAI - Copiloto Conversacional",
@@ -223,6 +225,13 @@ def initialize_session_state():
     
     if 'current_files' not in st.session_state:
         st.session_state.current_files = []
+    
+    if 'ingestion_job_id' not in st.session_state:
+        st.session_state.ingestion_job_id = None
+    
+    # Huellas de los corpus abiertos en esta sesión: solo estos se listan como guardados
+    if 'session_corpora' not in st.session_state:
+        st.session_state.session_corpora = []
 
 def main():
     initialize_session_state()
@@ -295,6 +304,11 @@ GOOGLE_API_KEY=tu_api_key_real_aqui
             """, unsafe_allow_html=True)
             
             st.info("👈 Sube algunos documentos PDF en la barra lateral para comenzar")
+    
+    # Mientras haya una ingesta en curso, refrescar para mostrar su progreso
+    if st.session_state.get('ingestion_polling'):
+        time.sleep(INGESTION_POLL_SECONDS)
+        st.rerun()
 
 def render_document_summary():
     st.markdown("""
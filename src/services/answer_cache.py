@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+import itertools
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+import numpy as np
+
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512"))
+
+
+class AnswerCache:
+    """Cache semántica de respuestas por corpus, con umbral de similitud, TTL y expulsión LRU"""
+
+    def __init__(
+        self,
+        similarity_threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl_seconds: float = ANSWER_CACHE_TTL,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES
+    ):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self, now: float):
+        """Drop entries older than the TTL"""
+        expired = [entry_id for entry_id, entry in self._entries.items()
+                   if now - entry['created'] > self.ttl_seconds]
+        for entry_id in expired:
+            del self._entries[entry_id]
+
+    def get(self, corpus_fingerprint: str, embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """Devuelve la respuesta cacheada más similar si supera el umbral"""
+        query = self._normalize(embedding)
+        now = time.time()
+
+        with self._lock:
+            self._expire(now)
+
+            best_id, best_score = None, self.similarity_threshold
+            for entry_id, entry in self._entries.items():
+                if entry['corpus'] != corpus_fingerprint or entry['vector'].shape != query.shape:
+                    continue
+                score = float(np.dot(entry['vector'], query))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            print(f"[DEBUG] Answer cache hit (similarity {best_score:.3f})")
+            return dict(self._entries[best_id]['result'])
+
+    def put(self, corpus_fingerprint: str, embedding: List[float], result: Dict[str, Any]):
+        """Guarda una respuesta para el corpus dado"""
+        with self._lock:
+            self._entries[next(self._ids)] = {
+                'corpus': corpus_fingerprint,
+                'vector': self._normalize(embedding),
+                'result': dict(result),
+                'created': time.time()
+            }
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+_shared_answer_cache: Optional[AnswerCache] = None
+_shared_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    """Devuelve la cache de respuestas compartida por el proceso"""
+    global _shared_answer_cache
+    with _shared_answer_cache_lock:
+        if _shared_answer_cache is None:
+            _shared_answer_cache = AnswerCache()
+        return _shared_answer_cache
+
+
+PARTIAL_CACHE_MAX_ENTRIES = int(os.getenv("PARTIAL_CACHE_MAX_ENTRIES", "1024"))
+
+
+class PartialResultCache:
+    """Cache LRU con TTL de resultados parciales por documento (p. ej. la fase map de una comparación)"""
+
+    def __init__(self, ttl_seconds: float = ANSWER_CACHE_TTL, max_entries: int = PARTIAL_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry['created'] > self.ttl_seconds:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry['value']
+
+    def put(self, key: tuple, value: str):
+        with self._lock:
+            self._entries[key] = {'value': value, 'created': time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+_shared_partial_cache: Optional[PartialResultCache] = None
+_shared_partial_cache_lock = threading.Lock()
+
+
+def get_partial_cache() -> PartialResultCache:
+    """Devuelve la cache de resultados parciales compartida por el proceso"""
+    global _shared_partial_cache
+    with _shared_partial_cache_lock:
+        if _shared_partial_cache is None:
+            _shared_partial_cache = PartialResultCache()
+        return _shared_partial_cache
@@ -0,0 +1,116 @@
+import os
+import re
+from collections import deque
+from typing import List, Dict, Tuple, Any
+from langchain.schema import Document
+from services.tokenizer import TOKENIZER_ENCODING, count_tokens, token_offsets
+
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "400"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?;:])\s+|\n")
+
+Span = Tuple[int, int]
+
+
+def _split_spans(text: str, start: int, end: int, pattern: "re.Pattern") -> List[Span]:
+    """Split text[start:end] at `pattern`, returning whitespace-trimmed, non-empty spans"""
+    spans = []
+    position = start
+    for match in pattern.finditer(text, start, end):
+        spans.append((position, match.start()))
+        position = match.end()
+    spans.append((position, end))
+
+    trimmed = []
+    for span_start, span_end in spans:
+        while span_start < span_end and text[span_start].isspace():
+            span_start += 1
+        while span_end > span_start and text[span_end - 1].isspace():
+            span_end -= 1
+        if span_start < span_end:
+            trimmed.append((span_start, span_end))
+    return trimmed
+
+
+class TokenChunker:
+    """Divide páginas en fragmentos medidos en tokens, respetando párrafos y frases"""
+
+    def __init__(self, chunk_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS):
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+
+    @property
+    def signature(self) -> str:
+        return f"tokens:{TOKENIZER_ENCODING}:{self.chunk_tokens}:{self.overlap_tokens}"
+
+    def _segments(self, text: str) -> List[Tuple[Span, int]]:
+        """Paragraphs, or sentences / token windows of paragraphs that exceed the chunk size"""
+        segments = []
+        for paragraph in _split_spans(text, 0, len(text), _PARAGRAPH_BREAK):
+            tokens = count_tokens(text[paragraph[0]:paragraph[1]])
+            if tokens <= self.chunk_tokens:
+                segments.append((paragraph, tokens))
+                continue
+
+            for sentence in _split_spans(text, paragraph[0], paragraph[1], _SENTENCE_BREAK):
+                sentence_text = text[sentence[0]:sentence[1]]
+                tokens = count_tokens(sentence_text)
+                if tokens <= self.chunk_tokens:
+                    segments.append((sentence, tokens))
+                    continue
+
+                # A single sentence longer than a chunk is cut at token boundaries
+                offsets = token_offsets(sentence_text)
+                for i in range(0, len(offsets), self.chunk_tokens):
+                    window_end = offsets[i + self.chunk_tokens] if i + self.chunk_tokens < len(offsets) else len(sentence_text)
+                    segments.append(
+                        ((sentence[0] + offsets[i], sentence[0] + window_end), min(self.chunk_tokens, len(offsets) - i))
+                    )
+        return segments
+
+    def split_page(self, text: str, metadata: Dict[str, Any], page_offset: int = 0) -> List[Document]:
+        """Divide el texto de una página en fragmentos con sus posiciones.
+
+        Chunks never cross the page. Each one records `start_index`/`end_index` within
+        the page, `file_offset` within the whole file text and its `token_count`.
+        Segments are measured once and packed greedily, so the cost is linear in the page.
+        """
+        chunks = []
+        current: deque = deque()
+        current_tokens = 0
+
+        def emit():
+            start, end = current[0][0][0], current[-1][0][1]
+            chunks.append(Document(
+                page_content=text[start:end],
+                metadata={
+                    **metadata,
+                    'start_index': start,
+                    'end_index': end,
+                    'file_offset': page_offset + start,
+                    'token_count': current_tokens
+                }
+            ))
+
+        for span, tokens in self._segments(text):
+            if current and current_tokens + tokens > self.chunk_tokens:
+                emit()
+                # Carry trailing segments into the next chunk as overlap
+                kept: deque = deque()
+                kept_tokens = 0
+                for kept_span, kept_span_tokens in reversed(current):
+                    if (kept_tokens + kept_span_tokens > self.overlap_tokens
+                            or kept_tokens + kept_span_tokens + tokens > self.chunk_tokens):
+                        break
+                    kept.appendleft((kept_span, kept_span_tokens))
+                    kept_tokens += kept_span_tokens
+                current, current_tokens = kept, kept_tokens
+
+            current.append((span, tokens))
+            current_tokens += tokens
+
+        if current:
+            emit()
+        return chunks
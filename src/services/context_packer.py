@@ -0,0 +1,108 @@
+import os
+from typing import List, Dict, Tuple, Any
+from langchain.schema import Document
+from services.tokenizer import count_tokens
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "4000"))
+
+
+def _subtract_spans(start: int, end: int, spans: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Parts of [start, end) not covered by any of `spans`"""
+    remaining = [(start, end)]
+    for span_start, span_end in spans:
+        next_remaining = []
+        for seg_start, seg_end in remaining:
+            if span_end <= seg_start or span_start >= seg_end:
+                next_remaining.append((seg_start, seg_end))
+                continue
+            if seg_start < span_start:
+                next_remaining.append((seg_start, span_start))
+            if span_end < seg_end:
+                next_remaining.append((span_end, seg_end))
+        remaining = next_remaining
+    return remaining
+
+
+class ContextPacker:
+    """Empaqueta fragmentos en un presupuesto de tokens, por relevancia y de forma equitativa entre documentos"""
+
+    def __init__(self, max_tokens: int = CONTEXT_TOKEN_BUDGET):
+        self.max_tokens = max_tokens
+
+    def _new_segments(self, doc: Document, selected: Dict[Tuple[str, Any], List[Tuple[int, int]]]):
+        """Return the (start, text) segments of `doc` not already covered by selected chunks"""
+        start = doc.metadata.get('start_index')
+        if start is None:
+            return [(None, doc.page_content)]
+
+        key = (doc.metadata.get('source', 'unknown'), doc.metadata.get('page'))
+        end = start + len(doc.page_content)
+        return [
+            (seg_start, doc.page_content[seg_start - start:seg_end - start])
+            for seg_start, seg_end in _subtract_spans(start, end, selected.get(key, []))
+        ]
+
+    def pack(self, docs: List[Document]) -> Tuple[str, int]:
+        """Devuelve (contexto, tokens usados) a partir de fragmentos ordenados por relevancia"""
+        docs_by_source: Dict[str, List[Document]] = {}
+        for doc in docs:
+            docs_by_source.setdefault(doc.metadata.get('source', 'unknown'), []).append(doc)
+
+        selected_spans: Dict[Tuple[str, Any], List[Tuple[int, int]]] = {}
+        selected_segments: Dict[str, List[Tuple[Any, Any, str]]] = {source: [] for source in docs_by_source}
+        seen_texts = set()
+        used_tokens = 0
+
+        # Round-robin by rank: every document gets its best chunk before any gets its second
+        max_rank = max((len(source_docs) for source_docs in docs_by_source.values()), default=0)
+        for rank in range(max_rank):
+            for source, source_docs in docs_by_source.items():
+                if rank >= len(source_docs):
+                    continue
+                doc = source_docs[rank]
+                if doc.page_content in seen_texts:
+                    continue
+
+                segments = [(seg_start, text) for seg_start, text in self._new_segments(doc, selected_spans)
+                            if text.strip()]
+                cost = sum(count_tokens(text) for _, text in segments)
+                if not segments or used_tokens + cost > self.max_tokens:
+                    continue
+
+                used_tokens += cost
+                seen_texts.add(doc.page_content)
+                page = doc.metadata.get('page')
+                for seg_start, text in segments:
+                    selected_segments[source].append((page, seg_start, text))
+                    if seg_start is not None:
+                        selected_spans.setdefault((source, page), []).append((seg_start, seg_start + len(text)))
+
+        structured_context = ""
+        for source, segments in selected_segments.items():
+            if not segments:
+                continue
+            structured_context += f"\n--- Documento: {source} ---\n"
+            structured_context += self._merge_segments(segments)
+            structured_context += "\n"
+
+        return structured_context, used_tokens
+
+    @staticmethod
+    def _merge_segments(segments: List[Tuple[Any, Any, str]]) -> str:
+        """Join segments in reading order, gluing spans that are contiguous on the same page"""
+        positioned = sorted(
+            (segment for segment in segments if segment[1] is not None),
+            key=lambda segment: (segment[0] if segment[0] is not None else -1, segment[1])
+        )
+        unpositioned = [segment[2] for segment in segments if segment[1] is None]
+
+        parts = []
+        previous_page, previous_end = None, None
+        for page, start, text in positioned:
+            if parts and page == previous_page and start == previous_end:
+                parts[-1] += text
+            else:
+                parts.append(text)
+            previous_page, previous_end = page, start + len(text)
+
+        return "\n".join(parts + unpositioned)
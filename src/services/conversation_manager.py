@@ -1,36 +1,65 @@
-from typing import List, Dict, Any, Optional
-from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
-from langchain.prompts import PromptTemplate
+from typing import List, Dict, Any, Optional, Iterator
 from langchain.schema import Document
 import os
+import re
 import time
+import asyncio
+from collections import OrderedDict
 import streamlit as st
-from langchain_google_genai import ChatGoogleGenerativeAI
-import hashlib
+from services.rate_limiter import is_rate_limit_error
+from services.answer_cache import get_answer_cache, get_partial_cache
+from services.context_packer import ContextPacker
+from services.store_registry import get_store_registry
+from services.resources import get_llm_gateway, get_api_key_hash, run_async
+from services.llm_gateway import as_gateway, LLMDeadlineExceeded, PRIORITY_INTERACTIVE, PRIORITY_ANALYSIS
+from services.lexical_index import reciprocal_rank_scores
+from services.metrics import get_metrics, record_llm_tokens
+from services.conversation_memory import ConversationMemory
+
+CANDIDATE_POOL_FACTOR = 3
+CHUNKS_PER_DOCUMENT = int(os.getenv("CHUNKS_PER_DOCUMENT", "3"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+COMPARE_CONCURRENCY = int(os.getenv("COMPARE_CONCURRENCY", "4"))
+COMPARE_CHUNKS_PER_DOCUMENT = int(os.getenv("COMPARE_CHUNKS_PER_DOCUMENT", "6"))
+COMPARE_DOCUMENT_TOKENS = int(os.getenv("COMPARE_DOCUMENT_TOKENS", "2000"))
+RESOLVED_SOURCES_CACHE_SIZE = 16
+FOLLOW_UP_MAX_WORDS = int(os.getenv("FOLLOW_UP_MAX_WORDS", "4"))
+# Openings and words that only make sense with the previous turns ("¿y sus fechas?", "explica eso")
+FOLLOW_UP_OPENINGS = ("y ", "e ", "pero ", "entonces ", "también ", "además ", "y qué", "y cuál", "y cómo")
+FOLLOW_UP_WORDS = {
+    "eso", "esto", "ello", "aquello", "ese", "esa", "esos", "esas", "anterior", "anteriores",
+    "mismo", "misma", "mismos", "mismas", "ahí", "allí", "él", "ella", "ellos", "ellas"
+}
 
 class ConversationManager:
-    def __init__(self, vector_store=None):
-        self.llm = None
+    def __init__(self, vector_store=None, sources: Optional[List[str]] = None,
+                 corpus_fingerprint: Optional[str] = None, lexical_index=None,
+                 document_summaries: Optional[Dict[str, str]] = None, llm=None,
+                 indexed_files: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.llm = as_gateway(llm)
         self.vector_store = vector_store
-        self.conversation_chain = None
+        self.lexical_index = lexical_index
+        self.sources = sources
+        self.corpus_fingerprint = corpus_fingerprint
+        # {file_hash: {'name', 'ids', ...}} from the processor, and the hash of each source name
+        self.indexed_files = indexed_files or {}
+        self.file_hashes = {entry['name']: file_hash for file_hash, entry in self.indexed_files.items()}
+        # Shared with the processor, which keeps filling it as background summaries finish
+        self.document_summaries = document_summaries if document_summaries is not None else {}
+        self.summary_answers: Dict[str, str] = {}
+        self.answer_cache = get_answer_cache()
+        self.partial_cache = get_partial_cache()
+        self.metrics = get_metrics()
+        self.context_packer = ContextPacker()
+        self._resolved_sources: "OrderedDict[tuple, List[Document]]" = OrderedDict()
         
         self._initialize_gemini()
         
-        self.memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            return_messages=True,
-            output_key="answer"
-        )
-        
-        if vector_store:
-            self._setup_conversation_chain()
+        self.memory = ConversationMemory(self.llm)
     
     def _get_api_key_hash(self, api_key: str) -> str:
         """Generate a hash of the API key for tracking"""
-        if not api_key:
-            return ""
-        return hashlib.md5(api_key.encode()).hexdigest()[:16]
+        return get_api_key_hash(api_key)
     
     def _initialize_gemini(self):
         """Initialize only Google Gemini with enhanced account change detection"""
@@ -49,13 +78,11 @@ class ConversationManager:
             st.info("Obtén tu API key gratuita en: https://makersuite.google.com/app/apikey")
             st.stop()
         
+        if self.llm is not None:
+            return
+        
         try:
-            self.llm = ChatGoogleGenerativeAI(
-                model="gemini-1.5-flash",
-                temperature=0.1,
-                google_api_key=google_api_key,
-                max_output_tokens=2048
-            )
+            self.llm = get_llm_gateway(google_api_key)
             print(f"[DEBUG] Gemini inicializado exitosamente con cuenta: {current_hash}")
         except Exception as e:
             st.error(f"Error inicializando Gemini: {e}")
@@ -67,8 +94,6 @@ class ConversationManager:
         if hasattr(self, 'memory'):
             self.memory.clear()
         
-        self.conversation_chain = None
-        
         conversation_keys = [
             'chat_history',
             'conversation_manager',
@@ -81,53 +106,221 @@ class ConversationManager:
         
         print("[DEBUG] Conversation data cleared for account change")
 
-    def _get_diverse_context(self, question: str, k_per_doc: int = 5) -> List[Document]:
+    def _load_sources(self) -> List[str]:
+        """Build the source registry from stored metadata when none was provided at ingest"""
+        all_docs = self.vector_store.get(include=["metadatas"])
+        unique_sources = set()
+        if all_docs and 'metadatas' in all_docs:
+            for metadata in all_docs['metadatas']:
+                if metadata and 'source' in metadata:
+                    unique_sources.add(metadata['source'])
+        return sorted(unique_sources)
+
+    def _lexical_search(self, question: str, k: int, source: Optional[str] = None) -> List[Document]:
+        """BM25 matches resolved to Documents from the vector store, in rank order"""
+        if not self.lexical_index:
+            return []
+        
+        chunk_ids = [chunk_id for chunk_id, _ in self.lexical_index.search(question, k=k, source=source)]
+        if not chunk_ids:
+            return []
+        
+        docs_by_id = self._documents_by_id(chunk_ids)
+        return [docs_by_id[chunk_id] for chunk_id in chunk_ids if chunk_id in docs_by_id]
+
+    def _documents_by_id(self, chunk_ids: List[str]) -> Dict[str, Document]:
+        """Fetch stored chunks as Documents, keyed by chunk ID"""
+        stored = self.vector_store.get(ids=chunk_ids, include=["documents", "metadatas"])
+        return {
+            chunk_id: Document(page_content=text, metadata=metadata or {})
+            for chunk_id, text, metadata in zip(stored['ids'], stored['documents'], stored['metadatas'])
+        }
+
+    def _fuse(self, dense_docs: List[Document], lexical_docs: List[Document]) -> List[Document]:
+        """Merge dense and BM25 rankings with reciprocal-rank fusion; the fused score is kept in metadata['score']"""
+        docs_by_key = {}
+        rankings = []
+        for ranking in (dense_docs, lexical_docs):
+            keys = []
+            for doc in ranking:
+                key = doc.metadata.get('chunk_id') or doc.page_content
+                docs_by_key.setdefault(key, doc)
+                keys.append(key)
+            rankings.append(keys)
+        
+        scores = reciprocal_rank_scores(rankings, k=RRF_K)
+        # New Documents: the retrieved metadata may be shared with the store or the answer cache
+        return [
+            Document(page_content=docs_by_key[key].page_content, metadata={**docs_by_key[key].metadata, 'score': scores[key]})
+            for key in sorted(scores, key=scores.get, reverse=True)
+        ]
+
+    def _get_diverse_context(self, question: str, k_per_doc: int = CHUNKS_PER_DOCUMENT) -> List[Document]:
         """Get diverse chunks from all documents to ensure all PDFs are represented"""
         if not self.vector_store:
             return []
         
         try:
-            all_docs = self.vector_store.get()
-            unique_sources = set()
-            if all_docs and 'metadatas' in all_docs:
-                for metadata in all_docs['metadatas']:
-                    if metadata and 'source' in metadata:
-                        unique_sources.add(metadata['source'])
+            if self.sources is None:
+                self.sources = self._load_sources()
+            
+            print(f"[DEBUG] Found {len(self.sources)} unique documents: {self.sources}")
+            
+            query_embedding = self.vector_store.embeddings.embed_query(question)
+            if hasattr(self.vector_store, 'grouped_search'):
+                return self._get_grouped_context(question, query_embedding, k_per_doc)
+            
+            # Una sola consulta densa y una léxica sobre un conjunto de candidatos, fusionadas y agrupadas por documento
+            pool_size = k_per_doc * len(self.sources) * CANDIDATE_POOL_FACTOR
+            dense_docs = [
+                doc for doc, _ in self.vector_store.similarity_search_by_vector_with_relevance_scores(
+                    query_embedding,
+                    k=pool_size
+                )
+            ]
+            candidates = self._fuse(dense_docs, self._lexical_search(question, k=pool_size))
             
-            print(f"[DEBUG] Found {len(unique_sources)} unique documents: {list(unique_sources)}")
+            docs_by_source = {source: [] for source in self.sources}
+            for doc in candidates:
+                source_docs = docs_by_source.get(doc.metadata.get('source'))
+                if source_docs is not None and len(source_docs) < k_per_doc:
+                    source_docs.append(doc)
             
             diverse_docs = []
             
-            for source in unique_sources:
-                try:
-                    source_docs = self.vector_store.similarity_search(
-                        question,
-                        k=k_per_doc,
-                        filter={"source": source}
-                    )
-                    diverse_docs.extend(source_docs)
-                    print(f"[DEBUG] Retrieved {len(source_docs)} chunks from {source}")
-                except Exception as e:
-                    print(f"[DEBUG] Error retrieving from {source}: {e}")
-                    all_source_docs = self.vector_store.similarity_search(question, k=25)
-                    filtered_docs = [doc for doc in all_source_docs if doc.metadata.get('source') == source]
-                    diverse_docs.extend(filtered_docs[:k_per_doc])
+            for source, source_docs in docs_by_source.items():
+                # Short documents cannot fill k_per_doc; only query a source that has more chunks to give
+                if len(source_docs) < min(k_per_doc, self._chunk_count(source)):
+                    try:
+                        source_docs = self._fuse(
+                            self.vector_store.similarity_search_by_vector(
+                                query_embedding,
+                                k=k_per_doc,
+                                filter={"source": source}
+                            ),
+                            self._lexical_search(question, k=k_per_doc, source=source)
+                        )[:k_per_doc]
+                    except Exception as e:
+                        print(f"[DEBUG] Error retrieving from {source}: {e}")
+                diverse_docs.extend(source_docs)
+                print(f"[DEBUG] Retrieved {len(source_docs)} chunks from {source}")
             
             print(f"[DEBUG] Total diverse chunks retrieved: {len(diverse_docs)}")
             return diverse_docs
             
         except Exception as e:
             print(f"[DEBUG] Error in diverse retrieval: {e}")
-            return self.vector_store.similarity_search(question, k=25)
+            return self.vector_store.similarity_search(question, k=k_per_doc * 2)
 
-    def _setup_conversation_chain(self):
-        """Configura la cadena conversacional"""
-        custom_prompt = PromptTemplate(
-            input_variables=["context", "question", "chat_history"],
-            template="""Eres un asistente especializado en analizar documentos PDF. Responde de forma concisa y directa.
+    def _chunk_count(self, source: str) -> float:
+        """Indexed chunks of a source; unknown (inf) when the corpus came without its file list"""
+        file_hash = self.file_hashes.get(source)
+        return len(self.indexed_files[file_hash]['ids']) if file_hash else float('inf')
 
-Contexto de múltiples documentos: {context}
+    def _get_grouped_context(self, question: str, query_embedding, k_per_doc: int) -> List[Document]:
+        """Exact per-document top-k from a single scan of the flat index, fused with BM25 per document"""
+        dense_by_source = self.vector_store.grouped_search(query_embedding, k=k_per_doc, sources=self.sources)
+        
+        diverse_docs = []
+        for source in self.sources:
+            source_docs = self._fuse(
+                [doc for doc, _ in dense_by_source.get(source, [])],
+                self._lexical_search(question, k=k_per_doc, source=source)
+            )[:k_per_doc]
+            diverse_docs.extend(source_docs)
+            print(f"[DEBUG] Retrieved {len(source_docs)} chunks from {source}")
+        
+        print(f"[DEBUG] Total diverse chunks retrieved: {len(diverse_docs)}")
+        return diverse_docs
+
+    @staticmethod
+    def source_refs(docs: List[Document]) -> List[Dict[str, Any]]:
+        """Referencias compactas a los fragmentos usados: {'id', 'score'}"""
+        return [
+            {"id": doc.metadata['chunk_id'], "score": doc.metadata.get('score')}
+            for doc in docs if doc.metadata.get('chunk_id')
+        ]
+
+    def resolve_sources(self, refs: List[Dict[str, Any]]) -> List[Document]:
+        """Recupera del corpus los fragmentos de una lista de referencias, en el mismo orden"""
+        if not refs or not self.vector_store:
+            return []
+        
+        key = tuple(ref['id'] for ref in refs)
+        if key in self._resolved_sources:
+            self._resolved_sources.move_to_end(key)
+            return self._resolved_sources[key]
+        
+        docs_by_id = self._documents_by_id(list(key))
+        docs = [
+            Document(page_content=docs_by_id[ref['id']].page_content,
+                     metadata={**docs_by_id[ref['id']].metadata, 'score': ref.get('score')})
+            for ref in refs if ref['id'] in docs_by_id
+        ]
+        
+        self._resolved_sources[key] = docs
+        if len(self._resolved_sources) > RESOLVED_SOURCES_CACHE_SIZE:
+            self._resolved_sources.popitem(last=False)
+        return docs
+
+    def _get_cached_answer(self, question: str):
+        """Return (cached_result, query_embedding) for the current corpus"""
+        if not self.corpus_fingerprint:
+            return None, None
+        query_embedding = self.vector_store.embeddings.embed_query(question)
+        cached_result = self.answer_cache.get(self.corpus_fingerprint, query_embedding)
+        self.metrics.increment("cache_requests_total", cache="answer", result="hit" if cached_result else "miss")
+        if cached_result:
+            cached_result["chat_history"] = self.memory.messages()
+            cached_result["source_refs"] = self.source_refs(cached_result["source_documents"])
+            cached_result["cached"] = True
+        return cached_result, query_embedding
+
+    def _cache_answer(self, query_embedding, answer: str, diverse_docs: List[Document]):
+        if self.corpus_fingerprint and query_embedding is not None:
+            self.answer_cache.put(self.corpus_fingerprint, query_embedding, {
+                "answer": answer,
+                "source_documents": diverse_docs
+            })
+
+    @staticmethod
+    def _is_follow_up(question: str, history: str) -> bool:
+        """True if the question depends on the conversation: very short, or referring back to it"""
+        if not history:
+            return False
+        text = question.lower().lstrip("¿¡ ").strip()
+        words = re.findall(r"\w+", text)
+        return (
+            len(words) <= FOLLOW_UP_MAX_WORDS
+            or text.startswith(FOLLOW_UP_OPENINGS)
+            or not FOLLOW_UP_WORDS.isdisjoint(words)
+        )
+
+    def _build_prompt(self, question: str, history: str = "", follow_up: bool = False):
+        """Retrieve diverse context and build the prompt; returns (prompt_text, diverse_docs)"""
+        if self.corpus_fingerprint:
+            get_store_registry().touch(self.corpus_fingerprint)
+        
+        # Follow-ups like "¿y sus fechas?" are retrieved together with the previous question
+        retrieval_query = f"{self.memory.last_question()} {question}" if follow_up else question
+        with self.metrics.span("retrieve"):
+            diverse_docs = self._get_diverse_context(retrieval_query)
+        
+        with self.metrics.span("context_build"):
+            structured_context, context_tokens = self.context_packer.pack(diverse_docs)
+        
+        source_files = {doc.metadata.get('source', 'unknown') for doc in diverse_docs}
+        print(f"[DEBUG] Context built from {len(source_files)} documents ({context_tokens} tokens)")
+        print(f"[DEBUG] Archivos consultados: {list(source_files)}")
+        
+        history_section = ""
+        if history:
+            history_section = f"\nConversación previa (úsala solo para entender a qué se refiere la pregunta):\n{history}\n"
+        
+        prompt_text = f"""Eres un asistente especializado en analizar documentos PDF. Responde de forma concisa y directa.
 
+Contexto de múltiples documentos: {structured_context}
+{history_section}
 Pregunta: {question}
 
 Instrucciones IMPORTANTES:
@@ -138,24 +331,50 @@ Instrucciones IMPORTANTES:
 - Si la pregunta es general, proporciona información de TODOS los archivos disponibles
 
 Respuesta:"""
-        )
         
-        retriever = self.vector_store.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 25}
-        )
+        return prompt_text, diverse_docs
+
+    def _error_response(self, e: Exception) -> Dict[str, Any]:
+        """Map an LLM/retrieval exception to a user-facing answer"""
+        print(f"[DEBUG] Error: {type(e).__name__}: {str(e)}")
+        error_message = str(e).lower()
         
-        self.conversation_chain = ConversationalRetrievalChain.from_llm(
-            llm=self.llm,
-            retriever=retriever,
-            memory=self.memory,
-            return_source_documents=True,
-            combine_docs_chain_kwargs={"prompt": custom_prompt}
-        )
-    
-    def ask_question(self, question: str) -> Dict[str, Any]:
+        if isinstance(e, LLMDeadlineExceeded):
+            return {
+                "answer": "Gemini está saturado en este momento. Vuelve a intentar en unos segundos.",
+                "source_documents": [],
+                "rate_limited": True
+            }
+        elif is_rate_limit_error(e):
+            return {
+                "answer": """Límite de Gemini alcanzado
+                    
+Posibles soluciones:
+1. Cambiar de cuenta Google: Usa el botón "Reiniciar Sesión Completa" en la barra lateral
+2. Espera 1-2 minutos y vuelve a intentar
+3. Verifica tu cuota en https://aistudio.google.com/
+4. Considera usar menos texto en tus preguntas
+
+Tip: Si tienes otra cuenta Google, cámbiala para obtener créditos frescos""",
+                "source_documents": [],
+                "rate_limited": True
+            }
+        elif any(keyword in error_message for keyword in ["api key", "authentication", "unauthorized", "401"]):
+            return {
+                "answer": "Error de autenticación: Verifica que tu GOOGLE_API_KEY esté configurada correctamente",
+                "source_documents": [],
+                "error_type": "auth_error"
+            }
+        else:
+            return {
+                "answer": f"Error: {str(e)}",
+                "source_documents": [],
+                "error_type": "unknown_error"
+            }
+
+    def ask_question(self, question: str, priority: int = PRIORITY_INTERACTIVE) -> Dict[str, Any]:
         """Procesa una pregunta y devuelve la respuesta"""
-        if not self.conversation_chain:
+        if not self.vector_store:
             return {
                 "answer": "Por favor, sube algunos documentos PDF primero.",
                 "source_documents": []
@@ -165,83 +384,137 @@ Respuesta:"""
             print(f"[DEBUG] Procesando pregunta: {question}")
             print(f"[DEBUG] Usando Gemini con cuenta: {st.session_state.get('conversation_api_hash', 'unknown')}")
             
-            diverse_docs = self._get_diverse_context(question)
+            # Analysis prompts sent through here are not part of the conversation
+            remember = priority == PRIORITY_INTERACTIVE
+            history = self.memory.context() if remember else ""
+            follow_up = self._is_follow_up(question, history)
             
-            context_by_source = {}
-            for doc in diverse_docs:
-                source = doc.metadata.get('source', 'unknown')
-                if source not in context_by_source:
-                    context_by_source[source] = []
-                context_by_source[source].append(doc.page_content)
+            # Answers to follow-ups depend on the conversation, so they skip the answer cache
+            cached_result, query_embedding = (None, None) if follow_up else self._get_cached_answer(question)
+            if cached_result:
+                if remember:
+                    self.memory.add_turn(question, cached_result["answer"])
+                return cached_result
             
-            structured_context = ""
-            for source, contents in context_by_source.items():
-                structured_context += f"\n--- Documento: {source} ---\n"
-                structured_context += "\n".join(contents[:3])
-                structured_context += "\n"
-            
-            print(f"[DEBUG] Context built from {len(context_by_source)} documents")
-            
-            prompt_text = f"""Eres un asistente especializado en analizar documentos PDF. Responde de forma concisa y directa.
-
-Contexto de múltiples documentos: {structured_context}
-
-Pregunta: {question}
-
-Instrucciones IMPORTANTES:
-- DEBES analizar TODOS los documentos diferentes proporcionados en el contexto
-- Si hay documentos de CV, horarios, análisis de riesgos, etc., menciona información de CADA UNO
-- Identifica claramente qué información viene de qué archivo
-- NO te enfoques solo en un tipo de documento
-- Si la pregunta es general, proporciona información de TODOS los archivos disponibles
-
-Respuesta:"""
+            prompt_text, diverse_docs = self._build_prompt(question, history, follow_up)
             
             start_time = time.time()
-            response = self.llm.invoke(prompt_text)
+            with self.metrics.span("llm", operation="question"):
+                response = self.llm.invoke(prompt_text, priority=priority)
             end_time = time.time()
+            record_llm_tokens("question", prompt_text, response.content)
             
             print(f"[DEBUG] Respuesta generada en {end_time - start_time:.2f} segundos")
             
-            source_files = set(context_by_source.keys())
-            print(f"[DEBUG] Archivos consultados: {list(source_files)}")
+            self._cache_answer(query_embedding, response.content, diverse_docs)
+            if remember:
+                self.memory.add_turn(question, response.content)
             
             return {
                 "answer": response.content,
                 "source_documents": diverse_docs,
-                "chat_history": self.memory.chat_memory.messages
+                "source_refs": self.source_refs(diverse_docs),
+                "chat_history": self.memory.messages()
             }
         
         except Exception as e:
-            print(f"[DEBUG] Error: {type(e).__name__}: {str(e)}")
-            error_message = str(e).lower()
+            return self._error_response(e)
+
+    def stream_question(self, question: str) -> Iterator[Dict[str, Any]]:
+        """Procesa una pregunta en modo streaming.
+        
+        Emite eventos {"delta": texto} a medida que llegan los tokens y un evento
+        final {"done": True, ...} con la misma forma que el resultado de ask_question.
+        """
+        if not self.vector_store:
+            yield {
+                "done": True,
+                "answer": "Por favor, sube algunos documentos PDF primero.",
+                "source_documents": []
+            }
+            return
+        
+        answer = ""
+        try:
+            print(f"[DEBUG] Procesando pregunta (streaming): {question}")
             
-            if any(keyword in error_message for keyword in ["429", "quota", "rate limit", "exceeded", "too many requests"]):
-                return {
-                    "answer": """Límite de Gemini alcanzado
-                    
-Posibles soluciones:
-1. Cambiar de cuenta Google: Usa el botón "Reiniciar Sesión Completa" en la barra lateral
-2. Espera 1-2 minutos y vuelve a intentar
-3. Verifica tu cuota en https://aistudio.google.com/
-4. Considera usar menos texto en tus preguntas
+            history = self.memory.context()
+            follow_up = self._is_follow_up(question, history)
+            
+            cached_result, query_embedding = (None, None) if follow_up else self._get_cached_answer(question)
+            if cached_result:
+                self.memory.add_turn(question, cached_result["answer"])
+                yield {"delta": cached_result["answer"]}
+                yield {"done": True, **cached_result}
+                return
+            
+            prompt_text, diverse_docs = self._build_prompt(question, history, follow_up)
+            
+            start_time = time.time()
+            first_token_time = None
+            for chunk in self.llm.stream(prompt_text):
+                if not chunk.content:
+                    continue
+                if first_token_time is None:
+                    first_token_time = time.time()
+                    self.metrics.observe("llm_time_to_first_token_seconds", first_token_time - start_time)
+                    print(f"[DEBUG] Primer token en {first_token_time - start_time:.2f} segundos")
+                answer += chunk.content
+                yield {"delta": chunk.content}
+            end_time = time.time()
+            self.metrics.observe("stage_duration_seconds", end_time - start_time,
+                                 stage="llm", status="ok", operation="question")
+            record_llm_tokens("question", prompt_text, answer)
+            
+            print(f"[DEBUG] Respuesta generada en {end_time - start_time:.2f} segundos")
+            
+            self._cache_answer(query_embedding, answer, diverse_docs)
+            self.memory.add_turn(question, answer)
+            
+            yield {
+                "done": True,
+                "answer": answer,
+                "source_documents": diverse_docs,
+                "source_refs": self.source_refs(diverse_docs),
+                "chat_history": self.memory.messages()
+            }
+        
+        except Exception as e:
+            result = self._error_response(e)
+            if answer:
+                # Keep what was already shown instead of replacing it with the error
+                result["answer"] = f"{answer}\n\n{result['answer']}"
+            yield {"done": True, **result}
 
-Tip: Si tienes otra cuenta Google, cámbiala para obtener créditos frescos""",
-                    "source_documents": [],
-                    "rate_limited": True
-                }
-            elif any(keyword in error_message for keyword in ["api key", "authentication", "unauthorized", "401"]):
-                return {
-                    "answer": "Error de autenticación: Verifica que tu GOOGLE_API_KEY esté configurada correctamente",
-                    "source_documents": [],
-                    "error_type": "auth_error"
-                }
-            else:
-                return {
-                    "answer": f"Error: {str(e)}",
-                    "source_documents": [],
-                    "error_type": "unknown_error"
-                }
+    def answer_from_summaries(self, instructions: str) -> Optional[str]:
+        """Responde a partir de los resúmenes precalculados de cada documento.
+        
+        Returns None when some indexed document has no stored summary, so callers
+        can fall back to retrieval. Answers are cached per instruction for this corpus.
+        """
+        # The summaries are still being filled in the background
+        document_summaries = dict(self.document_summaries)
+        if not document_summaries or (self.sources and set(self.sources) - set(document_summaries)):
+            return None
+        
+        if instructions not in self.summary_answers:
+            summaries = "".join(
+                f"\n--- Documento: {source} ---\n{summary}\n"
+                for source, summary in sorted(document_summaries.items())
+            )
+            prompt_text = f"""Eres un asistente especializado en analizar documentos PDF.
+
+Resúmenes de los documentos cargados: {summaries}
+{instructions}"""
+            
+            start_time = time.time()
+            with self.metrics.span("llm", operation="summaries"):
+                response = self.llm.invoke(prompt_text, priority=PRIORITY_ANALYSIS)
+            record_llm_tokens("summaries", prompt_text, response.content)
+            print(f"[DEBUG] Respuesta sobre resúmenes generada en {time.time() - start_time:.2f} segundos")
+            self.summary_answers[instructions] = response.content
+        
+        return self.summary_answers[instructions]
 
     def get_document_summary(self) -> str:
         """Genera un resumen de todos los documentos"""
@@ -258,26 +531,122 @@ Tip: Si tienes otra cuenta Google, cámbiala para obtener créditos frescos""",
         """
         
         try:
-            result = self.ask_question(summary_prompt)
+            answer = self.answer_from_summaries(summary_prompt)
+            if answer is not None:
+                return answer
+            result = self.ask_question(summary_prompt, priority=PRIORITY_ANALYSIS)
             return result["answer"]
         except:
             return "No se pudo generar el resumen."
     
+    def _document_context(self, aspect: str, source: str, query_embedding,
+                          dense_docs: Optional[List[Document]] = None) -> List[Document]:
+        """Top chunks about the aspect from a single document (dense and BM25, fused)"""
+        if dense_docs is None:
+            dense_docs = self.vector_store.similarity_search_by_vector(
+                query_embedding,
+                k=COMPARE_CHUNKS_PER_DOCUMENT,
+                filter={"source": source}
+            )
+        return self._fuse(
+            dense_docs,
+            self._lexical_search(aspect, k=COMPARE_CHUNKS_PER_DOCUMENT, source=source)
+        )[:COMPARE_CHUNKS_PER_DOCUMENT]
+
+    async def _extract_facts(self, aspect: str, source: str, docs: List[Document],
+                             semaphore: asyncio.Semaphore) -> str:
+        """Map step: facts about the aspect from one document, cached per file content, aspect and summary use"""
+        summary = self.document_summaries.get(source, "")
+        file_hash = self.file_hashes.get(source)
+        # Facts extracted before the summary was ready are not reused once it is
+        key = ("compare", file_hash, bool(summary), " ".join(aspect.lower().split())) if file_hash else None
+        cached = self.partial_cache.get(key) if key else None
+        if cached is not None:
+            return cached
+        
+        packer = ContextPacker(max_tokens=COMPARE_DOCUMENT_TOKENS)
+        context, _ = packer.pack(docs)
+        prompt_text = f"""Extrae del documento "{source}" los hechos relevantes sobre: {aspect}
+
+Resumen del documento: {summary}
+
+Fragmentos del documento: {context}
+
+Instrucciones:
+- Enumera solo hechos presentes en el documento, con cifras y nombres cuando existan
+- Si el documento no trata este aspecto, responde "Sin información sobre este aspecto"
+
+Hechos:"""
+        
+        async with semaphore:
+            start_time = time.time()
+            with self.metrics.span("llm", operation="compare_map"):
+                response = await self.llm.ainvoke(prompt_text, priority=PRIORITY_ANALYSIS)
+            record_llm_tokens("compare_map", prompt_text, response.content)
+            print(f"[DEBUG] Hechos de {source} extraídos en {time.time() - start_time:.2f} segundos")
+        
+        # Nothing to extract from is not worth remembering
+        if key and (context.strip() or summary):
+            self.partial_cache.put(key, response.content)
+        return response.content
+
+    async def _compare_documents_async(self, aspect: str, contexts: Dict[str, List[Document]]) -> str:
+        """Map-reduce: per-document extraction issued concurrently, then a single comparison"""
+        semaphore = asyncio.Semaphore(COMPARE_CONCURRENCY)
+        start_time = time.time()
+        partials = await asyncio.gather(*(
+            self._extract_facts(aspect, source, docs, semaphore) for source, docs in contexts.items()
+        ))
+        print(f"[DEBUG] Fase map de la comparación en {time.time() - start_time:.2f} segundos")
+        
+        facts = "".join(
+            f"\n--- Documento: {source} ---\n{partial}\n"
+            for source, partial in zip(contexts, partials)
+        )
+        comparison_prompt = f"""Compara los documentos cargados en términos de: {aspect}
+
+Hechos extraídos de cada documento: {facts}
+
+Proporciona:
+1. Similitudes encontradas
+2. Diferencias principales
+3. Análisis comparativo
+
+Estructura tu respuesta de manera clara y organizada."""
+        
+        with self.metrics.span("llm", operation="compare_reduce"):
+            response = await self.llm.ainvoke(comparison_prompt, priority=PRIORITY_ANALYSIS)
+        record_llm_tokens("compare_reduce", comparison_prompt, response.content)
+        return response.content
+
     def compare_documents(self, aspect: str) -> str:
         """Compara documentos en un aspecto específico"""
-        comparison_prompt = f"""
-        Compara los documentos cargados en términos de: {aspect}
-        
-        Proporciona:
-        1. Similitudes encontradas
-        2. Diferencias principales
-        3. Análisis comparativo
+        if not self.vector_store:
+            return "No hay documentos cargados."
         
-        Estructura tu respuesta de manera clara y organizada.
-        """
+        if self.corpus_fingerprint:
+            get_store_registry().touch(self.corpus_fingerprint)
         
         try:
-            result = self.ask_question(comparison_prompt)
-            return result["answer"]
-        except:
+            if self.sources is None:
+                self.sources = self._load_sources()
+            
+            # Retrieval is local and synchronous; only the LLM calls go to the event loop
+            query_embedding = self.vector_store.embeddings.embed_query(aspect)
+            dense_by_source = {}
+            if hasattr(self.vector_store, 'grouped_search'):
+                dense_by_source = {
+                    source: [doc for doc, _ in results]
+                    for source, results in self.vector_store.grouped_search(
+                        query_embedding, k=COMPARE_CHUNKS_PER_DOCUMENT, sources=self.sources
+                    ).items()
+                }
+            contexts = {
+                source: self._document_context(aspect, source, query_embedding, dense_by_source.get(source))
+                for source in self.sources
+            }
+            
+            return run_async(self._compare_documents_async(aspect, contexts))
+        except Exception as e:
+            print(f"[DEBUG] Error comparing documents: {type(e).__name__}: {e}")
             return "No se pudo realizar la comparación."
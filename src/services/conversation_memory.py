@@ -0,0 +1,151 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
+from services.tokenizer import count_tokens, token_offsets
+from services.metrics import get_metrics, record_llm_tokens
+from services.llm_gateway import PRIORITY_BACKGROUND
+
+MEMORY_RECENT_TOKENS = int(os.getenv("MEMORY_RECENT_TOKENS", "1000"))
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "300"))
+MEMORY_TURN_TOKENS = int(os.getenv("MEMORY_TURN_TOKENS", "500"))
+MEMORY_WORKERS = int(os.getenv("MEMORY_WORKERS", "2"))
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_memory_pool() -> ThreadPoolExecutor:
+    """Devuelve el pool compartido que actualiza los resúmenes de conversación fuera de las peticiones"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=MEMORY_WORKERS, thread_name_prefix="memory")
+        return _pool
+
+
+def clip_tokens(text: str, max_tokens: int) -> str:
+    """Recorta un texto a `max_tokens` tokens"""
+    offsets = token_offsets(text)
+    if len(offsets) <= max_tokens:
+        return text
+    return text[:offsets[max_tokens]].rstrip() + "…"
+
+
+class ConversationMemory:
+    """Memoria de conversación acotada en tokens: últimos turnos literales y un resumen acumulado del resto.
+
+    Turns that fall out of the recent window are folded into the summary by the LLM on a
+    background pool, so a question never waits for it and the history costs at most
+    MEMORY_SUMMARY_TOKENS + MEMORY_RECENT_TOKENS prompt tokens however long the session is.
+    """
+
+    def __init__(self, llm, recent_tokens: int = MEMORY_RECENT_TOKENS,
+                 summary_tokens: int = MEMORY_SUMMARY_TOKENS, turn_tokens: int = MEMORY_TURN_TOKENS):
+        self.llm = llm
+        self.recent_tokens = recent_tokens
+        self.summary_tokens = summary_tokens
+        self.turn_tokens = turn_tokens
+        self.summary = ""
+        self._recent: deque = deque()
+        self._recent_total = 0
+        self._pending: List[Tuple[str, str]] = []
+        self._folding = False
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def last_question(self) -> str:
+        with self._lock:
+            return self._recent[-1][0] if self._recent else ""
+
+    def messages(self) -> List[Dict[str, str]]:
+        """Turnos recientes como mensajes {'role', 'content'}"""
+        with self._lock:
+            return [
+                message for question, answer, _ in self._recent
+                for message in ({"role": "user", "content": question}, {"role": "assistant", "content": answer})
+            ]
+
+    def add_turn(self, question: str, answer: str):
+        """Guarda un turno; los que salen de la ventana reciente se resumen en segundo plano"""
+        question = clip_tokens(question, self.turn_tokens)
+        answer = clip_tokens(answer, self.turn_tokens)
+        tokens = count_tokens(question) + count_tokens(answer)
+        with self._lock:
+            self._recent.append((question, answer, tokens))
+            self._recent_total += tokens
+            while len(self._recent) > 1 and self._recent_total > self.recent_tokens:
+                old_question, old_answer, old_tokens = self._recent.popleft()
+                self._recent_total -= old_tokens
+                self._pending.append((old_question, old_answer))
+            if self._pending and not self._folding:
+                self._folding = True
+                get_memory_pool().submit(self._fold, self._generation)
+
+    def _fold(self, generation: int):
+        """Fold pending turns into the running summary until none are left"""
+        while True:
+            with self._lock:
+                # After clear() the flag belongs to the new conversation
+                if generation != self._generation:
+                    return
+                if not self._pending:
+                    self._folding = False
+                    return
+                summary, turns = self.summary, list(self._pending)
+
+            try:
+                updated = self._summarize(summary, turns)
+            except Exception as e:
+                print(f"[DEBUG] Warning: Could not update conversation summary: {type(e).__name__}: {e}")
+                with self._lock:
+                    if generation == self._generation:
+                        # Retried on the next turn
+                        self._folding = False
+                return
+
+            with self._lock:
+                if generation != self._generation:
+                    return
+                self.summary = updated
+                del self._pending[:len(turns)]
+
+    def _summarize(self, summary: str, turns: List[Tuple[str, str]]) -> str:
+        transcript = "\n".join(f"Usuario: {question}\nAsistente: {answer}" for question, answer in turns)
+        prompt = f"""Actualiza el resumen de una conversación sobre documentos PDF con los nuevos turnos.
+Conserva las preguntas del usuario, los datos concretos mencionados (nombres, cifras, documentos) y lo que quedó pendiente.
+Responde solo con el resumen actualizado, en menos de {self.summary_tokens * 3 // 4} palabras.
+
+Resumen actual: {summary or "(vacío)"}
+
+Nuevos turnos:
+{transcript}
+
+Resumen actualizado:"""
+        with get_metrics().span("llm", operation="memory"):
+            content = self.llm.invoke(prompt, priority=PRIORITY_BACKGROUND).content.strip()
+        record_llm_tokens("memory", prompt, content)
+        return clip_tokens(content, self.summary_tokens)
+
+    def context(self) -> str:
+        """Historial para el prompt: resumen acumulado y turnos recientes"""
+        with self._lock:
+            parts = []
+            if self.summary:
+                parts.append(f"Resumen de la conversación anterior: {self.summary}")
+            if self._recent:
+                parts.append("\n".join(
+                    f"Usuario: {question}\nAsistente: {answer}" for question, answer, _ in self._recent
+                ))
+            return "\n\n".join(parts)
+
+    def clear(self):
+        with self._lock:
+            # Folds already running for the old conversation discard their result
+            self._generation += 1
+            self.summary = ""
+            self._recent.clear()
+            self._recent_total = 0
+            self._pending = []
+            self._folding = False
@@ -0,0 +1,150 @@
+import os
+import json
+import threading
+from typing import List, Dict, Any, Optional, Tuple, Sequence
+import numpy as np
+
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_MANIFEST = "snapshot.json"
+SNAPSHOT_VECTORS = "snapshot_vectors.npy"
+SNAPSHOT_QUANTIZED = "snapshot_quantized.npy"
+SNAPSHOT_SCALES = "snapshot_scales.npy"
+SNAPSHOT_TEXT = "snapshot_text.bin"
+SNAPSHOT_OFFSETS = "snapshot_offsets.npy"
+
+
+class SnapshotTexts(Sequence):
+    """Chunk texts decoded on access from the memory-mapped UTF-8 blob"""
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self._data = data
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self._data[self._offsets[index]:self._offsets[index + 1]].tobytes().decode("utf-8")
+
+
+class CorpusSnapshot:
+    """Corpus procesado en disco: textos, metadatos y matriz de embeddings, abiertos con mmap.
+
+    The arrays are read-only memory maps, so every session and worker process that opens
+    the same snapshot shares its pages through the OS page cache.
+    """
+
+    def __init__(self, path: str, manifest: Dict[str, Any], vectors: np.ndarray, texts: SnapshotTexts,
+                 quantized: Optional[np.ndarray] = None, scales: Optional[np.ndarray] = None):
+        self.path = path
+        self.manifest = manifest
+        self.vectors = vectors
+        self.texts = texts
+        self.quantized = quantized
+        self.scales = scales
+
+    @property
+    def ids(self) -> List[str]:
+        return self.manifest['ids']
+
+    @property
+    def metadatas(self) -> List[Dict[str, Any]]:
+        return self.manifest['metadatas']
+
+    @property
+    def dtype(self) -> str:
+        return self.manifest['dtype']
+
+    def __len__(self) -> int:
+        return len(self.manifest['ids'])
+
+
+def _memmap(path: str, mmap_mode: str = "r") -> np.ndarray:
+    # Zero-length files cannot be memory-mapped
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode=mmap_mode)
+
+
+def write_snapshot(path: str, ids: List[str], documents: Sequence[str], metadatas: List[Dict[str, Any]],
+                   vectors: np.ndarray, dtype: str = "float32", quantized: Optional[np.ndarray] = None,
+                   scales: Optional[np.ndarray] = None):
+    """Escribe el snapshot de un corpus; el manifiesto se escribe al final y marca el snapshot como completo"""
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, SNAPSHOT_VECTORS), np.ascontiguousarray(vectors, dtype=np.float32))
+    if quantized is not None:
+        np.save(os.path.join(path, SNAPSHOT_QUANTIZED), quantized)
+    if scales is not None:
+        np.save(os.path.join(path, SNAPSHOT_SCALES), scales)
+
+    offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    with open(os.path.join(path, SNAPSHOT_TEXT), "wb") as f:
+        for i, text in enumerate(documents):
+            encoded = text.encode("utf-8")
+            f.write(encoded)
+            offsets[i + 1] = offsets[i] + len(encoded)
+    np.save(os.path.join(path, SNAPSHOT_OFFSETS), offsets)
+
+    manifest_path = os.path.join(path, SNAPSHOT_MANIFEST)
+    with open(f"{manifest_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump({
+            'format': SNAPSHOT_FORMAT,
+            'dtype': dtype,
+            'dimensions': int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+            'ids': ids,
+            'metadatas': metadatas
+        }, f, ensure_ascii=False)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+    _forget(path)
+
+
+_open_snapshots: Dict[str, Tuple[int, CorpusSnapshot]] = {}
+_open_snapshots_lock = threading.Lock()
+
+
+def _forget(path: str):
+    with _open_snapshots_lock:
+        _open_snapshots.pop(os.path.abspath(path), None)
+
+
+def open_snapshot(path: str) -> Optional[CorpusSnapshot]:
+    """Abre (o reutiliza en el proceso) el snapshot de un directorio; None si no hay uno completo"""
+    manifest_path = os.path.join(path, SNAPSHOT_MANIFEST)
+    try:
+        version = os.stat(manifest_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    key = os.path.abspath(path)
+    with _open_snapshots_lock:
+        cached = _open_snapshots.get(key)
+        if cached and cached[0] == version:
+            return cached[1]
+
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get('format') != SNAPSHOT_FORMAT:
+            print(f"[DEBUG] Ignoring snapshot with unknown format in {path}")
+            return None
+
+        quantized_path = os.path.join(path, SNAPSHOT_QUANTIZED)
+        scales_path = os.path.join(path, SNAPSHOT_SCALES)
+        snapshot = CorpusSnapshot(
+            path,
+            manifest,
+            np.load(os.path.join(path, SNAPSHOT_VECTORS), mmap_mode="r"),
+            SnapshotTexts(
+                _memmap(os.path.join(path, SNAPSHOT_TEXT)),
+                np.load(os.path.join(path, SNAPSHOT_OFFSETS), mmap_mode="r")
+            ),
+            np.load(quantized_path, mmap_mode="r") if os.path.exists(quantized_path) else None,
+            np.load(scales_path, mmap_mode="r") if os.path.exists(scales_path) else None
+        )
+        _open_snapshots[key] = (version, snapshot)
+        return snapshot
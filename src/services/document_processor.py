@@ -1,17 +1,79 @@
 import os
-import tempfile
-from typing import List, Dict, Any
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import Chroma
+from typing import List, Dict, Any, Optional, Callable, Tuple
 from langchain.schema import Document
 import streamlit as st
 import hashlib
 import shutil
+import copy
+import threading
+import weakref
+from concurrent.futures import Future
+from contextlib import ExitStack, closing
+from services.pdf_extractor import PageExtraction
+from services.resources import LLM_MODEL, get_llm_gateway, get_embeddings, get_api_key_hash
+from services.llm_gateway import as_gateway
+from services.store_registry import get_store_registry
+from services.embedding_backends import EmbeddingBackend
+from services.metrics import get_metrics
+from services.lexical_index import LexicalIndex
+from services.chunker import TokenChunker
+from services.summarizer import DocumentSummarizer, get_summary_store, get_summary_pool
+from services.vector_stores import open_vector_store, vector_store_signature
+
+INDEX_LAYOUT = f"{vector_store_signature()}+bm25:1"
+INGEST_BATCH_CHUNKS = int(os.getenv("INGEST_BATCH_CHUNKS", "256"))
+
+INGEST_STAGES = ["extract", "split", "embed", "persist"]
+
+
+class IngestionCancelled(Exception):
+    """La ingesta fue cancelada por el usuario"""
+
+
+class IngestionProgress:
+    """Progreso por etapa (extract, split, embed, persist) y cancelación de una ingesta"""
+
+    def __init__(self, callback: Optional[Callable[[str, float, str], None]] = None,
+                 cancel_event: Optional[threading.Event] = None):
+        self.callback = callback
+        self.cancel_event = cancel_event
+        self.total_pages = 0
+        self.pages_extracted = 0
+        self.chunks_split = 0
+        self.chunks_embedded = 0
+
+    def check_cancelled(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise IngestionCancelled()
+
+    def report(self, stage: str, fraction: float, message: str = ""):
+        if self.callback:
+            self.callback(stage, min(1.0, fraction), message)
+
+    def estimated_chunks(self) -> float:
+        """Chunks the whole ingest will produce, extrapolated from the pages split so far"""
+        if not self.pages_extracted:
+            return 0.0
+        return max(self.chunks_split, self.chunks_split / self.pages_extracted * self.total_pages)
+
+    def page_done(self, file_name: str, chunks: int):
+        self.pages_extracted += 1
+        self.chunks_split += chunks
+        fraction = self.pages_extracted / self.total_pages if self.total_pages else 1.0
+        message = f"{file_name}: página {self.pages_extracted}/{self.total_pages}"
+        self.report("extract", fraction, message)
+        self.report("split", fraction, message)
+        self.check_cancelled()
+
+    def chunks_done(self, file_name: str, chunks: int):
+        self.chunks_embedded += chunks
+        fraction = self.chunks_embedded / self.estimated_chunks() if self.chunks_split else 1.0
+        self.report("embed", fraction, f"{file_name}: {self.chunks_embedded} fragmentos indexados")
+        self.check_cancelled()
+
 
 class DocumentProcessor:
-    def __init__(self):
+    def __init__(self, embedding_backend: Optional[EmbeddingBackend] = None, llm=None):
         google_api_key = os.getenv("GOOGLE_API_KEY")
         
         if not google_api_key:
@@ -25,39 +87,41 @@ class DocumentProcessor:
                 self._cleanup_old_data()
         
         st.session_state.processor_api_hash = current_hash
+        self.account_hash = current_hash
             
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/embedding-001",
-            google_api_key=google_api_key
-        )
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
+        self.embedding_backend, self.embeddings = get_embeddings(google_api_key, embedding_backend)
+        self.embedding_backend.warm_up()
+        self.chunker = TokenChunker()
+        self.summarizer = DocumentSummarizer(
+            as_gateway(llm) or get_llm_gateway(google_api_key),
+            getattr(llm, 'model', LLM_MODEL) if llm else LLM_MODEL
         )
         self.vector_store = None
+        self.lexical_index = None
+        self.persist_directory = None
+        self._store_lease: Optional[weakref.finalize] = None
+        self.indexed_files: Dict[str, Dict[str, Any]] = {}
+        # (skipped name, indexed name) of uploads with identical content in the last ingest
+        self.duplicate_files: List[Tuple[str, str]] = []
+        self.document_summaries: Dict[str, str] = {}
+        self._summary_task: Optional[Future] = None
+        self.store_registry = get_store_registry()
     
     def _get_api_key_hash(self, api_key: str) -> str:
         """Generate a hash of the API key for tracking"""
-        if not api_key:
-            return ""
-        return hashlib.md5(api_key.encode()).hexdigest()[:16]
+        return get_api_key_hash(api_key)
     
     def _cleanup_old_data(self):
         """Clean up old vector store data when account changes"""
         try:
-            data_dir = "./data"
-            if os.path.exists(data_dir):
-                for item in os.listdir(data_dir):
-                    if item.startswith("chroma_db_"):
-                        item_path = os.path.join(data_dir, item)
-                        if os.path.isdir(item_path):
-                            shutil.rmtree(item_path)
-                            print(f"[DEBUG] Cleaned up old vector store: {item}")
+            get_store_registry().clear()
+            get_summary_store().clear()
         except Exception as e:
             print(f"[DEBUG] Warning: Could not clean up old data: {e}")
         
         self.vector_store = None
+        self.lexical_index = None
+        self.indexed_files = {}
         
         cleanup_keys = ['documents_processed', 'processing_results', 'current_files']
         for key in cleanup_keys:
@@ -66,77 +130,370 @@ class DocumentProcessor:
         
         print("[DEBUG] Document processor data cleaned for account change")
         
-    def process_pdfs(self, uploaded_files) -> Dict[str, Any]:
-        """Procesa los PDFs subidos y los vectoriza"""
-        if self.vector_store:
-            try:
-                self.vector_store.delete_collection()
-            except:
-                pass
-        self.vector_store = None
+    def _get_file_hash(self, content) -> str:
+        """Content hash used to detect new, changed and removed files"""
+        return hashlib.sha256(content).hexdigest()
+
+    def _get_chunk_id(self, file_hash: str, page: int, offset: int) -> str:
+        """Stable chunk ID derived from file content, page and offset"""
+        return hashlib.sha256(f"{file_hash}:{page}:{offset}".encode()).hexdigest()
+
+    def _hold_store(self, persist_directory: str):
+        """Lease the store directory from compaction for as long as this processor uses it.
         
-        all_documents = []
-        file_summaries = {}
+        A failed or cancelled ingest keeps its unregistered store for a later retry, so the
+        lease is only released when the processor moves to another store or is collected.
+        """
+        if self._store_lease is not None:
+            if self._store_lease.alive and self._store_lease.peek()[2] == (persist_directory,):
+                return
+            self._store_lease()
+        self.store_registry.lease(persist_directory)
+        self._store_lease = weakref.finalize(self, self.store_registry.release, persist_directory)
+
+    def _open_vector_store(self, persist_directory: str):
+        """Open (or create) the vector store persisted at a directory"""
+        self._hold_store(persist_directory)
+        self.vector_store = open_vector_store(self.embeddings, persist_directory)
+        self.persist_directory = persist_directory
+
+    def _prepare_vector_store(self):
+        """Make sure the session store can receive upserts without affecting registered corpora"""
+        account_hash = self.account_hash
         
-        progress_bar = st.progress(0)
-        status_text = st.empty()
+        if self.vector_store is None:
+            self.indexed_files = {}
+            self.lexical_index = LexicalIndex()
+            self._open_vector_store(self.store_registry.new_store_path(account_hash))
+            print(f"[DEBUG] Vector store created for account: {account_hash}")
+        elif self.store_registry.is_registered_path(self.persist_directory):
+            # Copy-on-write: registered stores may be reopened by other sessions
+            new_path = self.store_registry.new_store_path(account_hash)
+            self._hold_store(new_path)
+            shutil.copytree(self.persist_directory, new_path)
+            self._open_vector_store(new_path)
+            # Sessions holding the registered corpus keep searching the old index
+            self.lexical_index = copy.deepcopy(self.lexical_index) if self.lexical_index else LexicalIndex()
+            print(f"[DEBUG] Vector store copied for incremental update: {new_path}")
+
+    def _remove_file(self, file_hash: str):
+        """Delete every chunk indexed for a file"""
+        entry = self.indexed_files.pop(file_hash)
+        if entry['ids']:
+            self.vector_store.delete(ids=entry['ids'])
+            self.lexical_index.remove(entry['ids'])
+        print(f"[DEBUG] Removed {len(entry['ids'])} chunks from {entry['name']}")
+
+    def _add_chunks(self, chunks: List[Document], ids: List[str]):
+        """Embed chunks, then upsert them into the vector store and the lexical index"""
+        metrics = get_metrics()
+        # Embedding and the vector store write are timed as separate stages
+        embeddings = self.embeddings.embed_documents([chunk.page_content for chunk in chunks])
+        with metrics.span("persist"):
+            self.vector_store.upsert_embeddings(
+                ids=ids,
+                embeddings=embeddings,
+                metadatas=[chunk.metadata for chunk in chunks],
+                documents=[chunk.page_content for chunk in chunks]
+            )
+        for chunk, chunk_id in zip(chunks, ids):
+            self.lexical_index.add(chunk_id, chunk.metadata['source'], chunk.page_content)
+
+    def _index_pages(self, pages, file_name: str, file_index: int, file_hash: str, ids: List[str],
+                     progress: IngestionProgress) -> int:
+        """Split pages as they arrive and upsert them in bounded batches; returns the page count"""
+        page_count = 0
+        page_offset = 0
+        batch, batch_ids = [], []
         
-        for i, uploaded_file in enumerate(uploaded_files):
-            status_text.text(f'Procesando {uploaded_file.name}...')
-            
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                tmp_file.write(uploaded_file.getvalue())
-                tmp_file_path = tmp_file.name
-            
-            try:
-                loader = PyPDFLoader(tmp_file_path)
-                documents = loader.load()
-                
-                for doc in documents:
-                    doc.metadata['source_file'] = uploaded_file.name
-                    doc.metadata['file_index'] = i
-                
-                chunks = self.text_splitter.split_documents(documents)
-                all_documents.extend(chunks)
-                
-                file_summaries[uploaded_file.name] = {
-                    'pages': len(documents),
-                    'chunks': len(chunks),
-                    'size': len(uploaded_file.getvalue())
-                }
-                
-            finally:
-                os.unlink(tmp_file_path)
+        metrics = get_metrics()
+        for page, text in metrics.timed(pages, "extract"):
+            page_count += 1
+            with metrics.span("split"):
+                chunks = self.chunker.split_page(
+                    text,
+                    {
+                        'source': file_name,
+                        'page': page,
+                        'source_file': file_name,
+                        'file_index': file_index,
+                        'file_hash': file_hash
+                    },
+                    page_offset=page_offset
+                )
+            page_offset += len(text)
+            for chunk in chunks:
+                chunk_id = self._get_chunk_id(file_hash, page, chunk.metadata.get('start_index', 0))
+                chunk.metadata['chunk_id'] = chunk_id
+                batch.append(chunk)
+                batch_ids.append(chunk_id)
+            progress.page_done(file_name, len(chunks))
             
-            progress_bar.progress((i + 1) / len(uploaded_files))
+            if len(batch) >= INGEST_BATCH_CHUNKS:
+                self._add_chunks(batch, batch_ids)
+                ids.extend(batch_ids)
+                progress.chunks_done(file_name, len(batch))
+                batch, batch_ids = [], []
         
-        status_text.text('Creando índice vectorial...')
-        import time
-        account_hash = st.session_state.get('processor_api_hash', 'unknown')
-        unique_dir = f"./data/chroma_db_{account_hash}_{int(time.time())}"
+        if batch:
+            self._add_chunks(batch, batch_ids)
+            ids.extend(batch_ids)
+            progress.chunks_done(file_name, len(batch))
+        
+        return page_count
+
+    def _index_file(self, uploaded_file, pages: PageExtraction, file_index: int, file_hash: str,
+                    progress: IngestionProgress):
+        """Stream one PDF page by page through the chunker into the vector store"""
+        ids = []
         
         try:
-            self.vector_store = Chroma.from_documents(
-                documents=all_documents,
-                embedding=self.embeddings,
-                persist_directory=unique_dir
-            )
-            print(f"[DEBUG] Vector store created for account: {account_hash}")
-        except Exception as e:
-            st.error(f"Error creando índice vectorial: {e}")
-            st.info("Verifica que tu GOOGLE_API_KEY tenga permisos para embeddings")
-            raise e
+            page_count = self._index_pages(pages, uploaded_file.name, file_index, file_hash, ids, progress)
+        except Exception:
+            # Drop the partial file so the index never holds untracked chunks;
+            # its embeddings are already checkpointed, so a retry is cheap
+            if ids:
+                self.vector_store.delete(ids=ids)
+                self.lexical_index.remove(ids)
+            raise
+        
+        self.indexed_files[file_hash] = {
+            'name': uploaded_file.name,
+            'ids': ids,
+            'summary': {
+                'pages': page_count,
+                'chunks': len(ids),
+                'size': pages.size
+            }
+        }
+        print(f"[DEBUG] Indexed {len(ids)} chunks from {uploaded_file.name}")
+
+    def process_pdfs(self, uploaded_files, progress_callback: Optional[Callable[[str, float, str], None]] = None,
+                     cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """Procesa los PDFs subidos e indexa solo los archivos nuevos o modificados.
+        
+        No usa elementos de Streamlit, así que puede ejecutarse en un hilo de fondo:
+        el progreso por etapa se informa con `progress_callback(etapa, fracción, mensaje)`
+        y `cancel_event` permite cancelar entre páginas.
+        """
+        progress = IngestionProgress(progress_callback, cancel_event)
+        
+        current_files = {}
+        self.duplicate_files = []
+        for uploaded_file in uploaded_files:
+            with uploaded_file.getbuffer() as buffer:
+                file_hash = self._get_file_hash(buffer)
+            if file_hash in current_files:
+                # Same content under another name: indexed once, reported in the results
+                self.duplicate_files.append((uploaded_file.name, current_files[file_hash].name))
+                print(f"[DEBUG] {uploaded_file.name} duplicates {current_files[file_hash].name}, skipped")
+                continue
+            current_files[file_hash] = uploaded_file
+
+        target_fingerprint = self._compute_fingerprint(
+            {file_hash: uploaded_file.name for file_hash, uploaded_file in current_files.items()}
+        )
+        if self.vector_store is None or target_fingerprint != self.get_corpus_fingerprint():
+            with get_metrics().span("registry_lookup"):
+                entry = self.store_registry.lookup(target_fingerprint)
+            if entry and self._entry_matches(entry, target_fingerprint):
+                self._attach(entry, target_fingerprint)
+            else:
+                self._index_files(current_files, progress)
+                progress.report("persist", 0.0, "Registrando índice...")
+                self.vector_store.save()
+                self.lexical_index.save(self.persist_directory)
+                self.store_registry.register(
+                    target_fingerprint,
+                    self.persist_directory,
+                    # A snapshot: later deltas must not rewrite corpora registered before
+                    {'indexed_files': copy.deepcopy(self.indexed_files)}
+                )
+
+        for stage in INGEST_STAGES:
+            progress.report(stage, 1.0, "Procesamiento completado!")
+
+        results = self._build_results()
+        self._start_summaries()
+        return results
+
+    def _entry_matches(self, entry: Dict[str, Any], fingerprint: str) -> bool:
+        """True if a registry entry's files (and this processor's model and layout) yield `fingerprint`"""
+        files = {file_hash: indexed['name'] for file_hash, indexed in entry['metadata']['indexed_files'].items()}
+        return self._compute_fingerprint(files) == fingerprint
+
+    def _attach(self, entry: Dict[str, Any], fingerprint: str):
+        """Reopen a registered corpus (memory-mapped when it is a flat snapshot)"""
+        with get_metrics().span("restore"):
+            self._open_vector_store(entry['path'])
+            self.lexical_index = LexicalIndex.load(entry['path']) or LexicalIndex()
+            self.indexed_files = copy.deepcopy(entry['metadata']['indexed_files'])
+        print(f"[DEBUG] Reopened vector store for corpus {fingerprint[:12]}")
+
+    def restore_corpus(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Reabre un corpus ya procesado por su huella, sin volver a subir ni indexar los archivos"""
+        entry = self.store_registry.lookup(fingerprint)
+        # Corpora indexed with another embedding model or layout cannot be reused
+        if entry is None or not self._entry_matches(entry, fingerprint):
+            return None
+        
+        self._attach(entry, fingerprint)
+        self.duplicate_files = []
+        results = self._build_results()
+        self._start_summaries()
+        return results
+
+    def saved_corpora(self, fingerprints: List[str]) -> List[Dict[str, Any]]:
+        """Corpus de `fingerprints` que siguen registrados y este procesador puede reabrir, del más reciente al más antiguo.
         
-        status_text.text('Procesamiento completado!')
-        progress_bar.empty()
-        status_text.empty()
+        The registry is shared by every session of the process, so callers pass the
+        fingerprints their own session created instead of listing other users' uploads.
+        """
+        corpora = []
+        for fingerprint, entry in self.store_registry.entries().items():
+            if fingerprint not in fingerprints or not self._entry_matches(entry, fingerprint):
+                continue
+            indexed_files = entry['metadata']['indexed_files']
+            corpora.append({
+                'fingerprint': fingerprint,
+                'names': sorted(indexed['name'] for indexed in indexed_files.values()),
+                'chunks': sum(len(indexed['ids']) for indexed in indexed_files.values()),
+                'last_used': entry['last_used']
+            })
+        return sorted(corpora, key=lambda corpus: corpus['last_used'], reverse=True)
+
+    def _index_files(self, current_files: Dict[str, Any], progress: IngestionProgress):
+        """Apply the delta between the indexed files and the uploaded ones"""
+        self._prepare_vector_store()
+
+        for file_hash in list(self.indexed_files):
+            entry = self.indexed_files[file_hash]
+            if file_hash not in current_files or current_files[file_hash].name != entry['name']:
+                self._remove_file(file_hash)
+
+        new_files = []
+        for i, (file_hash, uploaded_file) in enumerate(current_files.items()):
+            if file_hash in self.indexed_files:
+                print(f"[DEBUG] {uploaded_file.name} sin cambios, se reutiliza el índice")
+            else:
+                new_files.append((i, file_hash, uploaded_file))
+
+        with ExitStack() as stack:
+            extractions = []
+            for _, _, uploaded_file in new_files:
+                buffer = stack.enter_context(uploaded_file.getbuffer())
+                # Closed before its buffer is released
+                extractions.append(stack.enter_context(closing(PageExtraction(buffer))))
+                progress.total_pages += extractions[-1].page_count
+
+            for position, (file_index, file_hash, uploaded_file) in enumerate(new_files):
+                progress.check_cancelled()
+                extractions[position].start()
+                if position + 1 < len(extractions):
+                    # The next file is parsed in the pool while this one is chunked and embedded
+                    extractions[position + 1].start()
+                self._index_file(uploaded_file, extractions[position], file_index, file_hash, progress)
+                extractions[position].close()
+
+    def _iter_file_text(self, entry: Dict[str, Any], vector_store):
+        """Read a file's chunks back from the store in reading order, without the overlap between them"""
+        previous_page, previous_end = None, 0
+        for i in range(0, len(entry['ids']), INGEST_BATCH_CHUNKS):
+            batch_ids = entry['ids'][i:i + INGEST_BATCH_CHUNKS]
+            stored = vector_store.get(ids=batch_ids, include=["documents", "metadatas"])
+            chunks = {chunk_id: (text, metadata) for chunk_id, text, metadata
+                      in zip(stored['ids'], stored['documents'], stored['metadatas'])}
+            for chunk_id in batch_ids:
+                if chunk_id not in chunks:
+                    continue
+                text, metadata = chunks[chunk_id]
+                page, start = metadata.get('page'), metadata.get('start_index', 0)
+                end = start + len(text)
+                if page == previous_page and start < previous_end:
+                    text = text[previous_end - start:]
+                previous_page, previous_end = page, end
+                if text.strip():
+                    yield page, text
+
+    def _start_summaries(self):
+        """Summarize the files without a stored summary on the shared pool, after the corpus is usable.
         
+        The task works on the current store and file list, so a later ingest cannot change
+        what it reads, and adds each summary to the dict returned with the corpus as soon
+        as it is ready. Until then the summary features fall back to retrieval.
+        """
+        pending = [
+            (file_hash, entry) for file_hash, entry in self.indexed_files.items()
+            if self.summarizer.store.get(file_hash, self.summarizer.model) is None
+        ]
+        if pending:
+            self._summary_task = get_summary_pool().submit(
+                self._summarize_files, pending, self.vector_store, self.document_summaries
+            )
+
+    def _summarize_files(self, pending, vector_store, summaries: Dict[str, str]):
+        """Summarize the pending files one by one; a failed file is retried the next time the corpus is opened"""
+        for file_hash, entry in pending:
+            try:
+                # Another session may have summarized the same file meanwhile
+                data = self.summarizer.store.get(file_hash, self.summarizer.model)
+                if data is None:
+                    with get_metrics().span("summarize"):
+                        data = self.summarizer.summarize(
+                            entry['name'], file_hash, self._iter_file_text(entry, vector_store)
+                        )
+                summaries[entry['name']] = data['summary']
+            except Exception as e:
+                print(f"[DEBUG] Warning: Could not summarize {entry['name']}: {type(e).__name__}: {e}")
+
+    def wait_for_summaries(self, timeout: Optional[float] = None):
+        """Espera a que terminen los resúmenes en segundo plano del último corpus"""
+        if self._summary_task is not None:
+            self._summary_task.result(timeout=timeout)
+
+    def get_document_summaries(self) -> Dict[str, str]:
+        """Resúmenes precalculados de los archivos indexados, por nombre de archivo"""
+        summaries = {}
+        for file_hash, entry in self.indexed_files.items():
+            data = self.summarizer.store.get(file_hash, self.summarizer.model)
+            if data:
+                summaries[entry['name']] = data['summary']
+        return summaries
+
+    def _build_results(self) -> Dict[str, Any]:
+        # A new dict per corpus: background summaries of an older corpus never land in it
+        self.document_summaries = self.get_document_summaries()
+        file_summaries = {entry['name']: entry['summary'] for entry in self.indexed_files.values()}
+
         return {
-            'total_documents': len(all_documents),
+            'total_documents': sum(len(entry['ids']) for entry in self.indexed_files.values()),
             'file_summaries': file_summaries,
-            'vector_store': self.vector_store
+            'sources': self.get_sources(),
+            'corpus_fingerprint': self.get_corpus_fingerprint(),
+            'vector_store': self.vector_store,
+            'lexical_index': self.lexical_index,
+            'document_summaries': self.document_summaries,
+            'indexed_files': dict(self.indexed_files),
+            'duplicate_files': list(self.duplicate_files)
         }
     
+    def _compute_fingerprint(self, files: Dict[str, str]) -> str:
+        """Fingerprint of a corpus given {file_hash: file_name}"""
+        digest = hashlib.sha256(self.embedding_backend.model_name.encode())
+        digest.update(self.chunker.signature.encode())
+        digest.update(INDEX_LAYOUT.encode())
+        for file_hash, name in sorted(files.items()):
+            digest.update(f"{file_hash}:{name}".encode())
+        return digest.hexdigest()
+    
+    def get_corpus_fingerprint(self) -> str:
+        """Huella del corpus indexado: cambia si cambia cualquier archivo, el modelo de embeddings o el chunking"""
+        return self._compute_fingerprint({file_hash: entry['name'] for file_hash, entry in self.indexed_files.items()})
+    
+    def get_sources(self) -> List[str]:
+        """Registro de fuentes indexadas, mantenido durante la ingesta"""
+        return sorted(entry['name'] for entry in self.indexed_files.values())
+    
     def get_relevant_documents(self, query: str, k: int = 4) -> List[Document]:
         """Obtiene documentos relevantes para una consulta"""
         if not self.vector_store:
@@ -0,0 +1,127 @@
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import List, Dict, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "google")
+GOOGLE_EMBEDDING_MODEL = "models/embedding-001"
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "32"))
+LOCAL_EMBEDDING_THREADS = int(os.getenv("LOCAL_EMBEDDING_THREADS", "0"))
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """Embeddings locales en CPU con sentence-transformers (float32 normalizados)"""
+
+    def __init__(self, model_name: str = LOCAL_EMBEDDING_MODEL, batch_size: int = LOCAL_EMBEDDING_BATCH_SIZE,
+                 num_threads: int = LOCAL_EMBEDDING_THREADS):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        """Load the model on first use (imports torch lazily)"""
+        with self._lock:
+            if self._model is None:
+                import torch
+                from sentence_transformers import SentenceTransformer
+
+                if self.num_threads > 0:
+                    torch.set_num_threads(self.num_threads)
+                self._model = SentenceTransformer(self.model_name, device="cpu")
+                print(f"[DEBUG] Local embedding model loaded: {self.model_name} ({torch.get_num_threads()} threads)")
+            return self._model
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        vectors = self._get_model().encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return np.asarray(vectors, dtype=np.float32)
+
+    def warm_up(self):
+        """Load the model and run one encode so the first real request is not slow"""
+        self._encode(["warm up"])
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+
+class EmbeddingBackend(ABC):
+    """Interfaz común de los backends de embeddings"""
+
+    # Identifier used for cache keys and corpus fingerprints
+    model_name: str = ""
+    # Remote backends go through the rate-limited EmbeddingScheduler
+    remote: bool = False
+
+    @abstractmethod
+    def get_embeddings(self) -> Embeddings:
+        """Cliente de embeddings compatible con LangChain"""
+
+    def warm_up(self):
+        pass
+
+
+class GoogleEmbeddingBackend(EmbeddingBackend):
+    """Backend remoto con la API de embeddings de Gemini"""
+
+    remote = True
+
+    def __init__(self, google_api_key: str):
+        self.model_name = GOOGLE_EMBEDDING_MODEL
+        self.google_api_key = google_api_key
+
+    def get_embeddings(self) -> Embeddings:
+        return GoogleGenerativeAIEmbeddings(
+            model=GOOGLE_EMBEDDING_MODEL,
+            google_api_key=self.google_api_key
+        )
+
+
+class LocalEmbeddingBackend(EmbeddingBackend):
+    """Backend local con sentence-transformers, sin llamadas de red ni cuota"""
+
+    remote = False
+
+    def __init__(self, model_name: str = LOCAL_EMBEDDING_MODEL):
+        self.model_name = model_name
+        self.embeddings = SentenceTransformerEmbeddings(model_name)
+        self._warmed_up = False
+
+    def get_embeddings(self) -> Embeddings:
+        return self.embeddings
+
+    def warm_up(self):
+        if not self._warmed_up:
+            self.embeddings.warm_up()
+            self._warmed_up = True
+
+
+_local_backends: Dict[str, LocalEmbeddingBackend] = {}
+_local_backends_lock = threading.Lock()
+
+
+def get_embedding_backend(google_api_key: Optional[str] = None) -> EmbeddingBackend:
+    """Devuelve el backend configurado en EMBEDDING_BACKEND ("google" o "local")"""
+    if EMBEDDING_BACKEND == "local":
+        # Local models are expensive to load, so one instance is shared by every session
+        with _local_backends_lock:
+            if LOCAL_EMBEDDING_MODEL not in _local_backends:
+                _local_backends[LOCAL_EMBEDDING_MODEL] = LocalEmbeddingBackend(LOCAL_EMBEDDING_MODEL)
+            return _local_backends[LOCAL_EMBEDDING_MODEL]
+
+    return GoogleEmbeddingBackend(google_api_key)
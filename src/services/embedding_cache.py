@@ -0,0 +1,208 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import List, Dict, Optional
+from langchain_core.embeddings import Embeddings
+from services.metrics import get_metrics
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./data/embedding_cache.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+
+
+class EmbeddingCache:
+    """Cache persistente de embeddings con expulsión LRU acotada por tamaño"""
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """Content-addressed key for a (model, text) pair"""
+        return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[int, List[float]]:
+        """Devuelve los embeddings cacheados indexados por posición en `texts`"""
+        keys = [self.make_key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = list(set(keys[start:start + 500]))
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch
+                ).fetchall()
+                found.update({key: blob for key, blob in rows})
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+
+        results = {}
+        for i, key in enumerate(keys):
+            if key in found:
+                results[i] = array("f", found[key]).tolist()
+        return results
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        """Guarda embeddings y aplica la expulsión LRU si se supera el límite"""
+        now = time.time()
+        rows = [
+            (self.make_key(model, text), array("f", vector).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                rows
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drop least recently used entries beyond max_entries"""
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                """DELETE FROM embeddings WHERE key IN (
+                    SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?
+                )""",
+                (excess,)
+            )
+            print(f"[DEBUG] Embedding cache evicted {excess} entries")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+class QueryEmbeddingCache:
+    """Cache LRU en memoria de embeddings de consultas, compartida entre sesiones"""
+
+    def __init__(self, max_entries: int = QUERY_EMBEDDING_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[tuple, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Unicode-normalize and collapse whitespace so trivially different questions share a key"""
+        return " ".join(unicodedata.normalize("NFC", text).split())
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        key = (model, self.normalize(text))
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, model: str, text: str, vector: List[float]):
+        key = (model, self.normalize(text))
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+class CachedEmbeddings(Embeddings):
+    """Envuelve un modelo de embeddings y solo calcula los textos no vistos"""
+
+    def __init__(self, embeddings, cache: EmbeddingCache, model: str, write_through: bool = True):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model
+        # Disabled when the wrapped embedder already checkpoints each batch into the cache
+        self.write_through = write_through
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        cached = self.cache.get_many(self.model, texts)
+        missing = [i for i in range(len(texts)) if i not in cached]
+
+        print(f"[DEBUG] Embedding cache: {len(cached)} hits, {len(missing)} misses")
+        metrics = get_metrics()
+        metrics.increment("cache_requests_total", len(cached), cache="embedding", result="hit")
+        metrics.increment("cache_requests_total", len(missing), cache="embedding", result="miss")
+
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            with metrics.span("embed", model=self.model):
+                vectors = self.embeddings.embed_documents(missing_texts)
+            if self.write_through:
+                self.cache.put_many(self.model, missing_texts, vectors)
+            for i, vector in zip(missing, vectors):
+                cached[i] = vector
+
+        return [cached[i] for i in range(len(texts))]
+
+    def embed_query(self, text: str) -> List[float]:
+        query_cache = get_query_embedding_cache()
+        vector = query_cache.get(self.model, text)
+        metrics = get_metrics()
+        metrics.increment("cache_requests_total", cache="query_embedding", result="miss" if vector is None else "hit")
+        if vector is None:
+            with metrics.span("embed_query", model=self.model):
+                vector = self.embeddings.embed_query(text)
+            query_cache.put(self.model, text, vector)
+        return vector
+
+
+_shared_cache: Optional[EmbeddingCache] = None
+_shared_query_cache: Optional[QueryEmbeddingCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Devuelve la cache de embeddings compartida por el proceso"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = EmbeddingCache()
+        return _shared_cache
+
+
+def get_query_embedding_cache() -> QueryEmbeddingCache:
+    """Devuelve la cache de embeddings de consultas compartida por el proceso"""
+    global _shared_query_cache
+    with _shared_cache_lock:
+        if _shared_query_cache is None:
+            _shared_query_cache = QueryEmbeddingCache()
+        return _shared_query_cache
@@ -0,0 +1,88 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Callable, Optional
+from langchain_core.embeddings import Embeddings
+from services.rate_limiter import TokenBucket, is_retryable_error, is_rate_limit_error, backoff_delay
+from services.metrics import get_metrics
+
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+EMBEDDING_REQUESTS_PER_MINUTE = float(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", "1500"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
+
+
+class EmbeddingScheduler(Embeddings):
+    """Calcula embeddings en lotes con concurrencia acotada, límite de tasa, reintentos y checkpoints"""
+
+    def __init__(
+        self,
+        embeddings,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        max_concurrency: int = EMBEDDING_MAX_CONCURRENCY,
+        rate_limiter: Optional[TokenBucket] = None,
+        max_retries: int = EMBEDDING_MAX_RETRIES,
+        base_delay: float = 1.0,
+        checkpoint: Optional[Callable[[List[str], List[List[float]]], None]] = None
+    ):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = rate_limiter or TokenBucket(
+            rate=EMBEDDING_REQUESTS_PER_MINUTE / 60.0,
+            capacity=max_concurrency
+        )
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.checkpoint = checkpoint
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed one batch, retrying retryable errors with jittered backoff"""
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+            except Exception as e:
+                if is_rate_limit_error(e):
+                    get_metrics().increment("rate_limited_total", source="embeddings")
+                if attempt == self.max_retries or not is_retryable_error(e):
+                    raise
+                delay = backoff_delay(attempt, self.base_delay)
+                print(f"[DEBUG] Embedding batch failed ({type(e).__name__}), retry {attempt + 1} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            # Each finished batch is checkpointed so a failed ingest resumes from here
+            if self.checkpoint:
+                self.checkpoint(texts, vectors)
+            return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        starts = list(range(0, len(texts), self.batch_size))
+
+        if len(starts) <= 1 or self.max_concurrency <= 1:
+            for start in starts:
+                results[start:start + self.batch_size] = self._embed_batch(texts[start:start + self.batch_size])
+            return results
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            futures = {
+                executor.submit(self._embed_batch, texts[start:start + self.batch_size]): start
+                for start in starts
+            }
+            try:
+                for future in as_completed(futures):
+                    start = futures[future]
+                    results[start:start + self.batch_size] = future.result()
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+
+        print(f"[DEBUG] Embedded {len(texts)} texts in {len(starts)} batches")
+        return results
+
+    def embed_query(self, text: str) -> List[float]:
+        self.rate_limiter.acquire()
+        return self.embeddings.embed_query(text)
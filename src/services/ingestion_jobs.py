@@ -0,0 +1,162 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+from services.document_processor import INGEST_STAGES, IngestionCancelled
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_MAX_FINISHED_JOBS = int(os.getenv("INGEST_MAX_FINISHED_JOBS", "50"))
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+ACTIVE_STATUSES = (JOB_QUEUED, JOB_RUNNING)
+
+
+class IngestionJob:
+    """Un trabajo de ingesta en segundo plano con progreso por etapa"""
+
+    def __init__(self, processor, uploaded_files: List[Any]):
+        self.id = uuid.uuid4().hex[:12]
+        self.processor = processor
+        self.uploaded_files = list(uploaded_files)
+        self.file_names = [uploaded_file.name for uploaded_file in uploaded_files]
+        self.status = JOB_QUEUED
+        self.progress: Dict[str, float] = {stage: 0.0 for stage in INGEST_STAGES}
+        self.message = "En cola..."
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.finished: Optional[float] = None
+        self.cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def update(self, stage: str, fraction: float, message: str = ""):
+        with self._lock:
+            self.progress[stage] = fraction
+            if message:
+                self.message = message
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Estado del trabajo para que la UI lo muestre"""
+        with self._lock:
+            return {
+                'id': self.id,
+                'status': self.status,
+                'progress': dict(self.progress),
+                'message': self.message,
+                'error': self.error,
+                'file_names': list(self.file_names)
+            }
+
+
+class IngestionJobManager:
+    """Cola de ingestas ejecutadas por un pool de hilos, compartida por todas las sesiones"""
+
+    def __init__(self, max_workers: int = INGEST_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._jobs: Dict[str, IngestionJob] = {}
+        self._lock = threading.Lock()
+
+    def _active_job_for(self, processor) -> Optional[IngestionJob]:
+        for job in self._jobs.values():
+            if job.processor is processor and job.status in ACTIVE_STATUSES:
+                return job
+        return None
+
+    def submit(self, processor, uploaded_files: List[Any]) -> str:
+        """Encola la ingesta y devuelve el ID del trabajo (uno activo por procesador)"""
+        with self._lock:
+            active = self._active_job_for(processor)
+            if active:
+                return active.id
+            job = IngestionJob(processor, uploaded_files)
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job)
+        print(f"[DEBUG] Ingestion job {job.id} queued with {len(job.file_names)} files")
+        return job.id
+
+    def resume(self, job_id: str) -> Optional[str]:
+        """Reanuda un trabajo fallido o cancelado.
+
+        Finished files are kept in the processor's index and embeddings are
+        checkpointed in the cache, so the rerun only pays for the remaining work.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status not in (JOB_FAILED, JOB_CANCELLED) or not job.uploaded_files:
+                return None
+            if self._active_job_for(job.processor):
+                return None
+            job.status = JOB_QUEUED
+            job.error = None
+            job.message = "Reanudando..."
+            job.cancel_event.clear()
+        self._executor.submit(self._run, job)
+        return job.id
+
+    def cancel(self, job_id: str):
+        job = self.get(job_id)
+        if job and job.status in ACTIVE_STATUSES:
+            job.cancel_event.set()
+            job.message = "Cancelando..."
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond INGEST_MAX_FINISHED_JOBS"""
+        finished = sorted(
+            (job for job in self._jobs.values() if job.status not in ACTIVE_STATUSES),
+            key=lambda job: job.created
+        )
+        for job in finished[:max(0, len(finished) - INGEST_MAX_FINISHED_JOBS)]:
+            del self._jobs[job.id]
+
+    def _run(self, job: IngestionJob):
+        if job.cancel_event.is_set():
+            job.status = JOB_CANCELLED
+            job.finished = time.time()
+            return
+
+        job.status = JOB_RUNNING
+        start_time = time.time()
+        try:
+            job.result = job.processor.process_pdfs(
+                job.uploaded_files,
+                progress_callback=job.update,
+                cancel_event=job.cancel_event
+            )
+            job.status = JOB_DONE
+            # The upload buffers are only needed to resume; release them once indexed
+            job.uploaded_files = []
+            print(f"[DEBUG] Ingestion job {job.id} done in {time.time() - start_time:.2f} seconds")
+        except IngestionCancelled:
+            job.status = JOB_CANCELLED
+            job.message = "Procesamiento cancelado"
+            print(f"[DEBUG] Ingestion job {job.id} cancelled")
+        except Exception as e:
+            job.status = JOB_FAILED
+            job.error = str(e)
+            print(f"[DEBUG] Ingestion job {job.id} failed: {type(e).__name__}: {e}")
+        finally:
+            job.finished = time.time()
+
+
+_shared_manager: Optional[IngestionJobManager] = None
+_shared_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> IngestionJobManager:
+    """Devuelve el gestor de trabajos de ingesta compartido por el proceso"""
+    global _shared_manager
+    with _shared_manager_lock:
+        if _shared_manager is None:
+            _shared_manager = IngestionJobManager()
+        return _shared_manager
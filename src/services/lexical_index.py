@@ -0,0 +1,146 @@
+import os
+import json
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import List, Dict, Tuple, Optional, Iterable
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.5"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+LEXICAL_INDEX_FILE = "lexical_index.json"
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, accent-folded word tokens; numbers and identifiers are kept whole"""
+    folded = unicodedata.normalize("NFKD", text.lower())
+    folded = "".join(char for char in folded if not unicodedata.combining(char))
+    return _TOKEN_PATTERN.findall(folded)
+
+
+class LexicalIndex:
+    """Índice invertido compacto con puntuación BM25 sobre los fragmentos indexados"""
+
+    def __init__(self):
+        # Chunks are referenced by a small integer slot; removed slots are tombstoned (None)
+        self._chunks: List[Optional[Tuple[str, str, int]]] = []
+        self._slots: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def add(self, chunk_id: str, source: str, text: str):
+        """Añade (o reemplaza) un fragmento al índice"""
+        if chunk_id in self._slots:
+            self.remove([chunk_id])
+
+        term_counts = Counter(tokenize(text))
+        length = sum(term_counts.values())
+        slot = len(self._chunks)
+        self._chunks.append((chunk_id, source, length))
+        self._slots[chunk_id] = slot
+        self._total_length += length
+        for term, count in term_counts.items():
+            self._postings.setdefault(term, {})[slot] = count
+
+    def remove(self, chunk_ids: Iterable[str]):
+        """Elimina fragmentos del índice"""
+        removed = set()
+        for chunk_id in chunk_ids:
+            slot = self._slots.pop(chunk_id, None)
+            if slot is None:
+                continue
+            self._total_length -= self._chunks[slot][2]
+            self._chunks[slot] = None
+            removed.add(slot)
+
+        if not removed:
+            return
+        for term in list(self._postings):
+            postings = self._postings[term]
+            for slot in removed.intersection(postings):
+                del postings[slot]
+            if not postings:
+                del self._postings[term]
+
+    def search(self, query: str, k: int, source: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Devuelve hasta k (chunk_id, puntuación BM25) ordenados por relevancia"""
+        if not self._slots:
+            return []
+
+        chunk_count = len(self._slots)
+        average_length = self._total_length / chunk_count or 1.0
+        scores: Dict[int, float] = {}
+
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (chunk_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for slot, frequency in postings.items():
+                _, chunk_source, length = self._chunks[slot]
+                if source is not None and chunk_source != source:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                scores[slot] = scores.get(slot, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self._chunks[slot][0], score) for slot, score in ranked]
+
+    def save(self, directory: str):
+        """Persiste el índice junto al vector store, compactando las ranuras eliminadas"""
+        renumber = {}
+        chunks = []
+        for slot, chunk in enumerate(self._chunks):
+            if chunk is not None:
+                renumber[slot] = len(chunks)
+                chunks.append(list(chunk))
+
+        data = {
+            'chunks': chunks,
+            'postings': {
+                term: [value for slot, count in postings.items() for value in (renumber[slot], count)]
+                for term, postings in self._postings.items()
+            }
+        }
+        path = os.path.join(directory, LEXICAL_INDEX_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["LexicalIndex"]:
+        """Carga el índice persistido en un directorio, o None si no existe"""
+        path = os.path.join(directory, LEXICAL_INDEX_FILE)
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"[DEBUG] Warning: Could not read lexical index {path}: {e}")
+            return None
+
+        index = cls()
+        index._chunks = [tuple(chunk) for chunk in data['chunks']]
+        index._slots = {chunk[0]: slot for slot, chunk in enumerate(index._chunks)}
+        index._total_length = sum(chunk[2] for chunk in index._chunks)
+        index._postings = {
+            term: dict(zip(flat[::2], flat[1::2]))
+            for term, flat in data['postings'].items()
+        }
+        return index
+
+
+def reciprocal_rank_scores(rankings: List[List[str]], k: int = 60) -> Dict[str, float]:
+    """Puntuación Reciprocal Rank Fusion de cada ID en varias listas ordenadas"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank + 1)
+    return scores
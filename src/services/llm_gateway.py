@@ -0,0 +1,197 @@
+import os
+import time
+import asyncio
+import hashlib
+import heapq
+import itertools
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from functools import partial
+from typing import Dict, Iterator, Optional
+from services.rate_limiter import TokenBucket, is_retryable_error, is_rate_limit_error, backoff_delay
+from services.metrics import get_metrics
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "15"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "6"))
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "60"))
+LLM_BACKGROUND_DEADLINE_SECONDS = float(os.getenv("LLM_BACKGROUND_DEADLINE_SECONDS", "600"))
+
+# Lower values are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_ANALYSIS = 1
+PRIORITY_BACKGROUND = 2
+
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_ANALYSIS: "analysis", PRIORITY_BACKGROUND: "background"}
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    """The request could not be admitted before its deadline"""
+
+
+class _PrioritySlots:
+    """Counting semaphore that admits waiters by (priority, arrival order)"""
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self._active = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def acquire(self, priority: int, deadline: float) -> bool:
+        ticket = (priority, next(self._sequence))
+        with self._condition:
+            heapq.heappush(self._waiters, ticket)
+            while self._waiters[0] != ticket or self._active >= self.slots:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiters.remove(ticket)
+                    heapq.heapify(self._waiters)
+                    self._condition.notify_all()
+                    return False
+                self._condition.wait(remaining)
+            heapq.heappop(self._waiters)
+            self._active += 1
+            # The next waiter may also fit in a free slot
+            self._condition.notify_all()
+            return True
+
+    def release(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+
+class LLMGateway:
+    """Punto único de acceso al LLM para todo el proceso.
+
+    Limits concurrency and request rate, retries 429s and transient errors with
+    jittered exponential backoff until a deadline, serves interactive chat before
+    analysis and background summaries, and coalesces identical in-flight prompts
+    into a single upstream call.
+    """
+
+    def __init__(
+        self,
+        llm,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        rate_limiter: Optional[TokenBucket] = None,
+        max_retries: int = LLM_MAX_RETRIES,
+        base_delay: float = 1.0
+    ):
+        self.llm = llm
+        self.slots = _PrioritySlots(max_concurrency)
+        self.rate_limiter = rate_limiter or TokenBucket(
+            rate=LLM_REQUESTS_PER_MINUTE / 60.0,
+            capacity=max_concurrency
+        )
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self._in_flight: Dict[str, Future] = {}
+        self._in_flight_lock = threading.Lock()
+
+    @property
+    def model(self) -> str:
+        return getattr(self.llm, 'model', type(self.llm).__name__)
+
+    def _deadline(self, priority: int, timeout: Optional[float]) -> float:
+        if timeout is None:
+            timeout = LLM_BACKGROUND_DEADLINE_SECONDS if priority == PRIORITY_BACKGROUND else LLM_DEADLINE_SECONDS
+        return time.monotonic() + timeout
+
+    @contextmanager
+    def _admitted(self, priority: int, deadline: float):
+        """Hold a concurrency slot and a rate-limit token for one upstream attempt"""
+        metrics = get_metrics()
+        start = time.perf_counter()
+        if not self.slots.acquire(priority, deadline):
+            raise LLMDeadlineExceeded("LLM request deadline exceeded while queued")
+        try:
+            if not self.rate_limiter.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                raise LLMDeadlineExceeded("LLM request deadline exceeded waiting for rate limit")
+            metrics.observe("llm_queue_seconds", time.perf_counter() - start, priority=PRIORITY_NAMES[priority])
+            yield
+        finally:
+            self.slots.release()
+
+    def _retry_or_raise(self, error: Exception, attempt: int, deadline: float):
+        """Sleep before the next attempt, or re-raise when the error is final or the deadline is near"""
+        if is_rate_limit_error(error):
+            get_metrics().increment("rate_limited_total", source="llm")
+        if attempt == self.max_retries or not is_retryable_error(error):
+            raise error
+        delay = backoff_delay(attempt, self.base_delay)
+        if time.monotonic() + delay >= deadline:
+            raise error
+        get_metrics().increment("llm_retries_total")
+        print(f"[DEBUG] LLM call failed ({type(error).__name__}), retry {attempt + 1} in {delay:.1f}s")
+        time.sleep(delay)
+
+    def _call(self, prompt: str, priority: int, deadline: float):
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self._admitted(priority, deadline):
+                    return self.llm.invoke(prompt)
+            except LLMDeadlineExceeded:
+                raise
+            except Exception as e:
+                self._retry_or_raise(e, attempt, deadline)
+
+    def invoke(self, prompt: str, priority: int = PRIORITY_INTERACTIVE, timeout: Optional[float] = None):
+        """Llama al LLM; prompts idénticos en curso comparten una sola llamada"""
+        deadline = self._deadline(priority, timeout)
+        key = hashlib.sha256(prompt.encode()).hexdigest()
+        with self._in_flight_lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+
+        if not leader:
+            get_metrics().increment("llm_coalesced_total")
+            try:
+                return future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                raise LLMDeadlineExceeded("LLM request deadline exceeded waiting for an identical call") from None
+
+        try:
+            future.set_result(self._call(prompt, priority, deadline))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[key]
+        return future.result()
+
+    async def ainvoke(self, prompt: str, priority: int = PRIORITY_INTERACTIVE, timeout: Optional[float] = None):
+        """Versión asíncrona de invoke (la espera en cola y los reintentos no bloquean el event loop)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(self.invoke, prompt, priority, timeout))
+
+    def stream(self, prompt: str, priority: int = PRIORITY_INTERACTIVE,
+               timeout: Optional[float] = None) -> Iterator:
+        """Streaming con las mismas colas; solo se reintenta si el error llega antes del primer fragmento"""
+        deadline = self._deadline(priority, timeout)
+        for attempt in range(self.max_retries + 1):
+            started = False
+            try:
+                with self._admitted(priority, deadline):
+                    for chunk in self.llm.stream(prompt):
+                        started = True
+                        yield chunk
+                return
+            except LLMDeadlineExceeded:
+                raise
+            except Exception as e:
+                if started:
+                    raise
+                self._retry_or_raise(e, attempt, deadline)
+
+
+def as_gateway(llm) -> Optional[LLMGateway]:
+    """Envuelve un modelo en un LLMGateway propio (modelos inyectados, p. ej. en benchmarks)"""
+    if llm is None or isinstance(llm, LLMGateway):
+        return llm
+    return LLMGateway(llm)
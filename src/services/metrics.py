@@ -0,0 +1,213 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple, List, Optional
+from services.tokenizer import count_tokens
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+METRICS_FILE_INTERVAL = float(os.getenv("METRICS_FILE_INTERVAL", "15"))
+METRICS_PREFIX = "catchai_"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Contadores e histogramas en memoria, exportables en formato de texto de Prometheus"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def increment(self, name: str, value: float = 1.0, **labels):
+        """Suma `value` a un contador"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **labels):
+        """Registra una observación en un histograma"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = _Histogram(buckets)
+            series[key].observe(value)
+
+    @contextmanager
+    def span(self, stage: str, **labels):
+        """Mide la duración de una etapa en el histograma stage_duration_seconds"""
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.observe("stage_duration_seconds", time.perf_counter() - start, stage=stage, status=status, **labels)
+
+    def timed(self, iterable, stage: str, **labels):
+        """Itera `iterable` midiendo el tiempo de producir cada elemento (para generadores como la extracción)"""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.observe("stage_duration_seconds", time.perf_counter() - start, stage=stage, status="ok", **labels)
+            yield item
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Totales por serie, útil para logs y benchmarks"""
+        with self._lock:
+            result = {}
+            for name, series in self._counters.items():
+                for key, value in series.items():
+                    result[f"{name}{_format_labels(key)}"] = {"value": value}
+            for name, series in self._histograms.items():
+                for key, histogram in series.items():
+                    result[f"{name}{_format_labels(key)}"] = {"count": histogram.count, "sum": histogram.total}
+            return result
+
+    def render_prometheus(self) -> str:
+        """Exporta todas las métricas en el formato de texto de Prometheus"""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                metric = f"{METRICS_PREFIX}{name}"
+                if name in self._help:
+                    lines.append(f"# HELP {metric} {self._help[name]}")
+                lines.append(f"# TYPE {metric} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{metric}{_format_labels(key)} {value}")
+
+            for name, series in sorted(self._histograms.items()):
+                metric = f"{METRICS_PREFIX}{name}"
+                if name in self._help:
+                    lines.append(f"# HELP {metric} {self._help[name]}")
+                lines.append(f"# TYPE {metric} histogram")
+                for key, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{metric}_bucket{_format_labels(key, ('le', repr(bound)))} {cumulative}")
+                    lines.append(f"{metric}_bucket{_format_labels(key, ('le', '+Inf'))} {histogram.count}")
+                    lines.append(f"{metric}_sum{_format_labels(key)} {histogram.total}")
+                    lines.append(f"{metric}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path: str):
+        """Escribe las métricas en un archivo (p. ej. para el textfile collector de node_exporter)"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+    def start_http_server(self, port: int):
+        """Sirve /metrics en un hilo daemon"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"[DEBUG] Metrics endpoint listening on :{port}/metrics")
+
+    def start_file_export(self, path: str, interval: float = METRICS_FILE_INTERVAL):
+        """Reescribe el archivo de métricas periódicamente en un hilo daemon"""
+        def run():
+            while True:
+                try:
+                    self.write_file(path)
+                except Exception as e:
+                    print(f"[DEBUG] Warning: Could not write metrics file: {e}")
+                time.sleep(interval)
+
+        threading.Thread(target=run, name="metrics-file", daemon=True).start()
+
+
+_shared_metrics: Optional[MetricsRegistry] = None
+_shared_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Devuelve el registro de métricas del proceso, iniciando la exportación configurada"""
+    global _shared_metrics
+    with _shared_metrics_lock:
+        if _shared_metrics is None:
+            _shared_metrics = MetricsRegistry()
+            _shared_metrics.describe("stage_duration_seconds", "Duración de cada etapa de ingesta y consulta")
+            _shared_metrics.describe("cache_requests_total", "Consultas a caches por resultado (hit/miss)")
+            _shared_metrics.describe("rate_limited_total", "Respuestas 429 / límite de cuota recibidas")
+            _shared_metrics.describe("llm_tokens_total", "Tokens enviados y recibidos del LLM")
+            _shared_metrics.describe("llm_time_to_first_token_seconds", "Tiempo hasta el primer token en streaming")
+            _shared_metrics.describe("llm_queue_seconds", "Espera en la cola del LLMGateway por prioridad")
+            _shared_metrics.describe("llm_retries_total", "Reintentos de llamadas al LLM tras 429 o errores transitorios")
+            _shared_metrics.describe("llm_coalesced_total", "Llamadas al LLM resueltas por una llamada idéntica en curso")
+            if METRICS_PORT:
+                try:
+                    _shared_metrics.start_http_server(METRICS_PORT)
+                except OSError as e:
+                    # Streamlit may import this in several processes; only the first can bind
+                    print(f"[DEBUG] Warning: Could not start metrics endpoint: {e}")
+            if METRICS_FILE:
+                _shared_metrics.start_file_export(METRICS_FILE)
+        return _shared_metrics
+
+
+def record_llm_tokens(operation: str, prompt: str, completion: str):
+    """Cuenta los tokens de una llamada al LLM por operación (question, summary, compare...)"""
+    metrics = get_metrics()
+    metrics.increment("llm_tokens_total", count_tokens(prompt), kind="prompt", operation=operation)
+    metrics.increment("llm_tokens_total", count_tokens(completion), kind="completion", operation=operation)
@@ -0,0 +1,211 @@
+import io
+import os
+import shutil
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+from typing import Iterator, List, Tuple, Optional
+from pypdf import PdfReader
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+PDF_POOL_MIN_BYTES = int(os.getenv("PDF_POOL_MIN_BYTES", str(512 * 1024)))
+PDF_MAX_INFLIGHT_TASKS = int(os.getenv("PDF_MAX_INFLIGHT_TASKS", str(2 * PDF_WORKERS)))
+PDF_SHM_DIR = "/dev/shm"
+PDF_SHM_HEADROOM_BYTES = int(os.getenv("PDF_SHM_HEADROOM_BYTES", str(16 * 1024 * 1024)))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_shm_reserved = 0
+_shm_lock = threading.Lock()
+
+
+class MemoryReader(io.RawIOBase):
+    """Stream de solo lectura sobre un buffer en memoria, sin copiarlo"""
+
+    def __init__(self, buffer):
+        self._buffer = memoryview(buffer).cast("B")
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        size = min(len(target), len(self._buffer) - self._position)
+        if size <= 0:
+            return 0
+        target[:size] = self._buffer[self._position:self._position + size]
+        self._position += size
+        return size
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._position = offset
+        elif whence == io.SEEK_CUR:
+            self._position += offset
+        elif whence == io.SEEK_END:
+            self._position = len(self._buffer) + offset
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self):
+        if not self.closed:
+            self._buffer.release()
+        super().close()
+
+
+def _extract_shared_range(name: str, size: int, start: int, end: int) -> List[Tuple[int, str]]:
+    """Extract text for pages [start, end) of a PDF held in shared memory (runs in a worker process)"""
+    shm = SharedMemory(name=name)
+    try:
+        buffer = shm.buf[:size]
+        try:
+            with MemoryReader(buffer) as stream:
+                reader = PdfReader(stream)
+                return [(page, reader.pages[page].extract_text()) for page in range(start, end)]
+        finally:
+            buffer.release()
+    finally:
+        shm.close()
+
+
+def get_extraction_pool() -> ProcessPoolExecutor:
+    """Devuelve el pool de procesos compartido para extracción de PDFs"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+            print(f"[DEBUG] PDF extraction pool started with {PDF_WORKERS} workers")
+        return _pool
+
+
+def _reserve_shared_memory(size: int) -> bool:
+    """Reserve room for an upload on /dev/shm; False when it would not fit.
+    
+    Writing past the end of a full tmpfs kills the whole process with SIGBUS (Docker's
+    default /dev/shm is 64 MB), so files that do not fit are extracted in-process.
+    Segments are sized when created but only take space as they are written, hence the
+    in-process count of reserved bytes on top of the free space.
+    """
+    global _shm_reserved
+    if not os.path.isdir(PDF_SHM_DIR):
+        # Not a Linux tmpfs: shared memory is backed by regular virtual memory
+        return True
+    try:
+        free = shutil.disk_usage(PDF_SHM_DIR).free
+    except OSError:
+        return False
+    with _shm_lock:
+        if _shm_reserved + size + PDF_SHM_HEADROOM_BYTES > free:
+            return False
+        _shm_reserved += size
+        return True
+
+
+def _release_shared_memory(size: int):
+    global _shm_reserved
+    with _shm_lock:
+        _shm_reserved -= size
+
+
+def _reset_pool():
+    """Discard a broken pool so the next call starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+
+class PageExtraction:
+    """Extracción de un PDF en memoria que emite sus páginas en orden como (página, texto).
+
+    Page ranges are parsed in the shared process pool; small files go to the pool whole,
+    so several of them are parsed in parallel. start() submits the first ranges without
+    reading them, which lets the next file be parsed while the current one is still being
+    chunked and embedded. Files that do not fit on /dev/shm are parsed in-process.
+    The buffer must stay valid until close().
+    """
+
+    def __init__(self, buffer: memoryview):
+        self.size = buffer.nbytes
+        self._buffer = buffer
+        self._stream = MemoryReader(buffer)
+        self._reader = PdfReader(self._stream)
+        self.page_count = len(self._reader.pages)
+        self._pooled = PDF_WORKERS > 1 and self.page_count > 0
+        task_pages = PDF_PAGES_PER_TASK if self.size >= PDF_POOL_MIN_BYTES else max(1, self.page_count)
+        self._pending = deque(
+            (start, min(start + task_pages, self.page_count))
+            for start in range(0, self.page_count, task_pages)
+        )
+        self._inflight = deque()
+        self._next_page = 0
+        self._shm: Optional[SharedMemory] = None
+
+    def _submit(self):
+        if not self._pooled:
+            return
+        if self._shm is None:
+            if not _reserve_shared_memory(self.size):
+                print(f"[DEBUG] PDF of {self.size} bytes does not fit in {PDF_SHM_DIR}, extracting in-process")
+                self._pooled = False
+                return
+            # The only copy of the upload: worker processes cannot see the Streamlit buffer directly
+            try:
+                self._shm = SharedMemory(create=True, size=self.size)
+            except OSError:
+                _release_shared_memory(self.size)
+                raise
+            self._shm.buf[:self.size] = self._buffer
+        pool = get_extraction_pool()
+        while self._pending and len(self._inflight) < PDF_MAX_INFLIGHT_TASKS:
+            start, end = self._pending.popleft()
+            self._inflight.append(pool.submit(_extract_shared_range, self._shm.name, self.size, start, end))
+
+    def start(self):
+        """Envía las primeras páginas al pool de procesos sin esperar el resultado"""
+        try:
+            self._submit()
+        except BrokenProcessPool:
+            # Surfaces again while iterating, which falls back to sequential extraction
+            pass
+
+    def __iter__(self) -> Iterator[Tuple[int, str]]:
+        if self._pooled:
+            try:
+                self._submit()
+                while self._inflight:
+                    for page, text in self._inflight.popleft().result():
+                        self._next_page = page + 1
+                        yield page, text
+                    self._submit()
+            except BrokenProcessPool as e:
+                print(f"[DEBUG] PDF extraction pool failed, extracting sequentially: {e}")
+                _reset_pool()
+                self._cancel()
+
+        for page in range(self._next_page, self.page_count):
+            self._next_page = page + 1
+            yield page, self._reader.pages[page].extract_text()
+
+    def _cancel(self):
+        for future in self._inflight:
+            future.cancel()
+        self._inflight.clear()
+        self._pending.clear()
+
+    def close(self):
+        """Cancela el trabajo pendiente y libera la memoria compartida y las vistas del buffer"""
+        self._cancel()
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+            _release_shared_memory(self.size)
+        self._stream.close()
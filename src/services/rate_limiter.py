@@ -0,0 +1,58 @@
+import random
+import threading
+import time
+from typing import Optional
+
+RATE_LIMIT_KEYWORDS = ["429", "quota", "rate limit", "exceeded", "too many requests", "resource exhausted"]
+TRANSIENT_KEYWORDS = ["timeout", "timed out", "deadline", "unavailable", "500", "503", "connection"]
+
+
+class TokenBucket:
+    """Limitador de tasa tipo token bucket, seguro entre hilos"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """Block until `tokens` are available; returns False if `timeout` expires first"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True if the exception looks like a Gemini 429 / quota error"""
+    message = str(error).lower()
+    return any(keyword in message for keyword in RATE_LIMIT_KEYWORDS)
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """True for rate limits and transient network/server errors"""
+    message = str(error).lower()
+    return is_rate_limit_error(error) or any(keyword in message for keyword in TRANSIENT_KEYWORDS)
+
+
+def backoff_delay(attempt: int, base_delay: float = 1.0, max_delay: float = 30.0) -> float:
+    """Exponential backoff with full jitter for the given retry attempt"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
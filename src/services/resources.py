@@ -0,0 +1,100 @@
+import asyncio
+import hashlib
+import threading
+from typing import Dict, Tuple, Optional
+from langchain_google_genai import ChatGoogleGenerativeAI
+from services.embedding_cache import CachedEmbeddings, get_embedding_cache
+from services.embedding_scheduler import EmbeddingScheduler
+from services.embedding_backends import EmbeddingBackend, get_embedding_backend
+from services.llm_gateway import LLMGateway
+
+LLM_MODEL = "gemini-1.5-flash"
+
+_llm_clients: Dict[str, ChatGoogleGenerativeAI] = {}
+_llm_gateways: Dict[str, LLMGateway] = {}
+_embeddings: Dict[Tuple[str, str], Tuple[EmbeddingBackend, CachedEmbeddings]] = {}
+_lock = threading.Lock()
+_event_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_api_key_hash(api_key: str) -> str:
+    """Generate a hash of the API key for tracking"""
+    if not api_key:
+        return ""
+    return hashlib.md5(api_key.encode()).hexdigest()[:16]
+
+
+def get_llm(google_api_key: str) -> ChatGoogleGenerativeAI:
+    """Cliente Gemini compartido por todas las sesiones que usan la misma API key"""
+    key_hash = get_api_key_hash(google_api_key)
+    with _lock:
+        if key_hash not in _llm_clients:
+            _llm_clients[key_hash] = ChatGoogleGenerativeAI(
+                model=LLM_MODEL,
+                temperature=0.1,
+                google_api_key=google_api_key,
+                max_output_tokens=2048
+            )
+            print(f"[DEBUG] Gemini client created for account: {key_hash}")
+        return _llm_clients[key_hash]
+
+
+def get_llm_gateway(google_api_key: str) -> LLMGateway:
+    """Gateway del LLM compartido por todas las sesiones que usan la misma API key.
+
+    One gateway per account means one concurrency limit, one rate limit and one
+    coalescing table across every session of the process.
+    """
+    llm = get_llm(google_api_key)
+    key_hash = get_api_key_hash(google_api_key)
+    with _lock:
+        if key_hash not in _llm_gateways:
+            _llm_gateways[key_hash] = LLMGateway(llm)
+        return _llm_gateways[key_hash]
+
+
+def _create_embeddings(backend: EmbeddingBackend) -> CachedEmbeddings:
+    """Wrap a backend with the embedding cache (and the scheduler for remote backends)"""
+    cache = get_embedding_cache()
+    model = backend.model_name
+
+    if not backend.remote:
+        return CachedEmbeddings(backend.get_embeddings(), cache=cache, model=model)
+
+    scheduler = EmbeddingScheduler(
+        backend.get_embeddings(),
+        checkpoint=lambda texts, vectors: cache.put_many(model, texts, vectors)
+    )
+    return CachedEmbeddings(scheduler, cache=cache, model=model, write_through=False)
+
+
+def get_embeddings(google_api_key: str,
+                   backend: Optional[EmbeddingBackend] = None) -> Tuple[EmbeddingBackend, CachedEmbeddings]:
+    """Backend y cliente de embeddings compartidos por todas las sesiones con la misma API key.
+
+    Sharing the client also shares the scheduler's rate limiter, so concurrent
+    sessions stay under one quota instead of each assuming it has the whole budget.
+    An explicit `backend` (e.g. a local stand-in for benchmarks) overrides EMBEDDING_BACKEND.
+    """
+    backend = backend or get_embedding_backend(google_api_key)
+    key = (get_api_key_hash(google_api_key), backend.model_name)
+    with _lock:
+        if key not in _embeddings:
+            _embeddings[key] = (backend, _create_embeddings(backend))
+            print(f"[DEBUG] Embedding client created for {backend.model_name}")
+        return _embeddings[key]
+
+
+def run_async(coroutine):
+    """Ejecuta una corrutina en el event loop compartido y espera su resultado.
+
+    LLMGateway.ainvoke runs the blocking invoke in the loop's default executor, so one
+    long-lived loop keeps those threads alive across calls instead of asyncio.run()
+    creating and shutting down a loop and its executor for every comparison.
+    """
+    global _event_loop
+    with _lock:
+        if _event_loop is None:
+            _event_loop = asyncio.new_event_loop()
+            threading.Thread(target=_event_loop.run_forever, name="llm-async", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coroutine, _event_loop).result()
@@ -0,0 +1,206 @@
+import os
+import json
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, Any, Optional
+
+DATA_DIR = os.getenv("DATA_DIR", "./data")
+STORE_TTL_SECONDS = float(os.getenv("STORE_TTL_SECONDS", str(7 * 24 * 3600)))
+STORE_MAX_COUNT = int(os.getenv("STORE_MAX_COUNT", "20"))
+STORE_MAX_BYTES = int(os.getenv("STORE_MAX_BYTES", str(2 * 1024 ** 3)))
+STORE_LEASE_SECONDS = float(os.getenv("STORE_LEASE_SECONDS", "1800"))
+STORE_COMPACTION_INTERVAL = float(os.getenv("STORE_COMPACTION_INTERVAL", "600"))
+STORE_PREFIX = "chroma_db_"
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class StoreRegistry:
+    """Registro de vector stores persistidos por huella de corpus, con recolección de basura"""
+
+    def __init__(self, base_dir: str = DATA_DIR):
+        self.base_dir = base_dir
+        self.manifest_path = os.path.join(base_dir, "store_registry.json")
+        self._lock = threading.RLock()
+        self._compaction_thread = None
+        self._leases: Dict[str, int] = {}
+        os.makedirs(base_dir, exist_ok=True)
+        self._entries: Dict[str, Dict[str, Any]] = self._load_manifest()
+
+    def _load_manifest(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"[DEBUG] Warning: Could not read store registry, starting empty: {e}")
+            return {}
+
+    def _save_manifest(self):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def new_store_path(self, account_hash: str) -> str:
+        """Ruta única para un nuevo vector store"""
+        return os.path.join(self.base_dir, f"{STORE_PREFIX}{account_hash}_{int(time.time())}_{uuid.uuid4().hex[:8]}")
+
+    def lookup(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Devuelve la entrada registrada para una huella, si su directorio sigue existiendo"""
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is None:
+                return None
+            if not os.path.isdir(entry['path']):
+                del self._entries[fingerprint]
+                self._save_manifest()
+                return None
+            entry['last_used'] = time.time()
+            self._save_manifest()
+            return dict(entry)
+
+    def entries(self) -> Dict[str, Dict[str, Any]]:
+        """Copia de las entradas registradas, por huella"""
+        with self._lock:
+            return {
+                fingerprint: dict(entry) for fingerprint, entry in self._entries.items()
+                if os.path.isdir(entry['path'])
+            }
+
+    def touch(self, fingerprint: str):
+        """Mark a corpus as in use (renews its lease; persisted on the next manifest write)"""
+        with self._lock:
+            if fingerprint in self._entries:
+                self._entries[fingerprint]['last_used'] = time.time()
+
+    def lease(self, path: str):
+        """Marca un directorio de store como en uso por un procesador (compact no lo elimina)"""
+        with self._lock:
+            key = os.path.abspath(path)
+            self._leases[key] = self._leases.get(key, 0) + 1
+
+    def release(self, path: str):
+        """Libera un lease tomado con lease()"""
+        with self._lock:
+            key = os.path.abspath(path)
+            if self._leases.get(key, 0) <= 1:
+                self._leases.pop(key, None)
+            else:
+                self._leases[key] -= 1
+
+    def is_registered_path(self, path: str) -> bool:
+        with self._lock:
+            return any(entry['path'] == path for entry in self._entries.values())
+
+    def register(self, fingerprint: str, path: str, metadata: Dict[str, Any]):
+        """Registra (o actualiza) el store persistido para una huella"""
+        now = time.time()
+        with self._lock:
+            self._entries[fingerprint] = {
+                'path': path,
+                'created': self._entries.get(fingerprint, {}).get('created', now),
+                'last_used': now,
+                'bytes': _dir_size(path),
+                'metadata': metadata
+            }
+            self._save_manifest()
+        print(f"[DEBUG] Registered vector store {os.path.basename(path)} for corpus {fingerprint[:12]}")
+
+    def _remove(self, fingerprint: str, reason: str):
+        entry = self._entries.pop(fingerprint)
+        shutil.rmtree(entry['path'], ignore_errors=True)
+        print(f"[DEBUG] Evicted vector store {os.path.basename(entry['path'])} ({reason})")
+
+    def evict(self):
+        """Expulsa stores por TTL, por número máximo (LRU) y por presupuesto de disco"""
+        now = time.time()
+        with self._lock:
+            for fingerprint, entry in list(self._entries.items()):
+                if now - entry['last_used'] > STORE_TTL_SECONDS:
+                    self._remove(fingerprint, "ttl")
+
+            # Stores used recently are leased by a live session and are never evicted by LRU or size
+            by_age = sorted(self._entries.items(), key=lambda item: item[1]['last_used'])
+            evictable = [fp for fp, entry in by_age if now - entry['last_used'] > STORE_LEASE_SECONDS]
+
+            total_bytes = sum(entry.get('bytes', 0) for entry in self._entries.values())
+            while evictable and (len(self._entries) > STORE_MAX_COUNT or total_bytes > STORE_MAX_BYTES):
+                fingerprint = evictable.pop(0)
+                total_bytes -= self._entries[fingerprint].get('bytes', 0)
+                self._remove(fingerprint, "lru" if len(self._entries) > STORE_MAX_COUNT else "disk budget")
+
+            self._save_manifest()
+
+    def compact(self):
+        """Evict stores and delete orphaned store directories that are neither registered nor leased"""
+        self.evict()
+        now = time.time()
+        with self._lock:
+            registered = {os.path.abspath(entry['path']) for entry in self._entries.values()}
+            for item in os.listdir(self.base_dir):
+                item_path = os.path.join(self.base_dir, item)
+                if not item.startswith(STORE_PREFIX) or not os.path.isdir(item_path):
+                    continue
+                if os.path.abspath(item_path) in registered or os.path.abspath(item_path) in self._leases:
+                    continue
+                # Leases are per process; this guards stores of other processes sharing DATA_DIR
+                if now - os.path.getmtime(item_path) < STORE_LEASE_SECONDS:
+                    continue
+                shutil.rmtree(item_path, ignore_errors=True)
+                print(f"[DEBUG] Removed orphaned vector store: {item}")
+
+    def clear(self):
+        """Elimina todos los stores (cambio de cuenta)"""
+        with self._lock:
+            for fingerprint in list(self._entries):
+                self._remove(fingerprint, "account change")
+            for item in os.listdir(self.base_dir):
+                item_path = os.path.join(self.base_dir, item)
+                if item.startswith(STORE_PREFIX) and os.path.isdir(item_path):
+                    shutil.rmtree(item_path, ignore_errors=True)
+                    print(f"[DEBUG] Cleaned up old vector store: {item}")
+            self._save_manifest()
+
+    def start_background_compaction(self, interval: float = STORE_COMPACTION_INTERVAL):
+        """Lanza un hilo daemon que compacta periódicamente"""
+        with self._lock:
+            if self._compaction_thread is not None:
+                return
+
+            def run():
+                while True:
+                    try:
+                        self.compact()
+                    except Exception as e:
+                        print(f"[DEBUG] Warning: Store compaction failed: {e}")
+                    time.sleep(interval)
+
+            self._compaction_thread = threading.Thread(target=run, name="store-compaction", daemon=True)
+            self._compaction_thread.start()
+
+
+_shared_registry: Optional[StoreRegistry] = None
+_shared_registry_lock = threading.Lock()
+
+
+def get_store_registry() -> StoreRegistry:
+    """Devuelve el registro de stores compartido por el proceso"""
+    global _shared_registry
+    with _shared_registry_lock:
+        if _shared_registry is None:
+            _shared_registry = StoreRegistry()
+            _shared_registry.start_background_compaction()
+        return _shared_registry
@@ -0,0 +1,185 @@
+import os
+import json
+import shutil
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+from services.store_registry import DATA_DIR
+from services.tokenizer import count_tokens
+from services.metrics import get_metrics, record_llm_tokens
+from services.llm_gateway import PRIORITY_BACKGROUND
+
+SUMMARY_SECTION_TOKENS = int(os.getenv("SUMMARY_SECTION_TOKENS", "3000"))
+SUMMARY_REDUCE_TOKENS = int(os.getenv("SUMMARY_REDUCE_TOKENS", "6000"))
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "4"))
+SUMMARY_BACKGROUND_WORKERS = int(os.getenv("SUMMARY_BACKGROUND_WORKERS", "1"))
+
+
+class SummaryStore:
+    """Resúmenes por documento persistidos en disco, indexados por hash de archivo y modelo"""
+
+    def __init__(self, directory: str = os.path.join(DATA_DIR, "summaries")):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, file_hash: str) -> str:
+        return os.path.join(self.directory, f"{file_hash}.json")
+
+    def get(self, file_hash: str, model: str) -> Optional[Dict[str, Any]]:
+        """Devuelve el resumen guardado de un archivo, si existe para ese modelo"""
+        try:
+            with open(self._path(file_hash), encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"[DEBUG] Warning: Could not read summary {file_hash[:12]}: {e}")
+            return None
+        return data if data.get('model') == model else None
+
+    def put(self, file_hash: str, data: Dict[str, Any]):
+        path = self._path(file_hash)
+        tmp_path = f"{path}.tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+
+    def clear(self):
+        """Elimina todos los resúmenes (cambio de cuenta)"""
+        with self._lock:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            os.makedirs(self.directory, exist_ok=True)
+
+
+class DocumentSummarizer:
+    """Resumen jerárquico de un documento: fragmentos → secciones de páginas → documento"""
+
+    def __init__(self, llm, model: str, store: Optional[SummaryStore] = None,
+                 max_workers: int = SUMMARY_WORKERS):
+        self.llm = llm
+        self.model = model
+        self.store = store or get_summary_store()
+        self.max_workers = max_workers
+
+    def _invoke(self, prompt: str) -> str:
+        with get_metrics().span("llm", operation="summarize"):
+            content = self.llm.invoke(prompt, priority=PRIORITY_BACKGROUND).content.strip()
+        record_llm_tokens("summarize", prompt, content)
+        return content
+
+    def _summarize_section(self, file_name: str, first_page: int, last_page: int, text: str) -> str:
+        return self._invoke(f"""Resume la siguiente sección (páginas {first_page + 1}-{last_page + 1}) del documento "{file_name}".
+Conserva nombres, cifras, fechas e identificadores importantes. Responde en un párrafo breve.
+
+Sección:
+{text}
+
+Resumen:""")
+
+    def _combine(self, file_name: str, summaries: List[str]) -> str:
+        joined = "\n\n".join(summaries)
+        return self._invoke(f"""Los siguientes son resúmenes consecutivos de partes del documento "{file_name}".
+Combínalos en un único resumen del documento que incluya su propósito, temas principales y datos clave.
+
+Resúmenes:
+{joined}
+
+Resumen del documento:""")
+
+    def _sections(self, pieces: Iterable[Tuple[int, str]]) -> Iterable[Tuple[int, int, str]]:
+        """Group (page, text) pieces in reading order into sections of at most SUMMARY_SECTION_TOKENS"""
+        parts, first_page, last_page, tokens = [], None, None, 0
+        for page, text in pieces:
+            text_tokens = count_tokens(text)
+            if parts and tokens + text_tokens > SUMMARY_SECTION_TOKENS:
+                yield first_page, last_page, "\n".join(parts)
+                parts, first_page, tokens = [], None, 0
+            if first_page is None:
+                first_page = page
+            parts.append(text)
+            last_page = page
+            tokens += text_tokens
+        if parts:
+            yield first_page, last_page, "\n".join(parts)
+
+    def _reduce(self, file_name: str, summaries: List[str]) -> str:
+        """Combine section summaries level by level until a single document summary remains"""
+        while len(summaries) > 1:
+            groups, current, tokens = [], [], 0
+            for summary in summaries:
+                summary_tokens = count_tokens(summary)
+                # At least two summaries per group, so every level shrinks
+                if len(current) > 1 and tokens + summary_tokens > SUMMARY_REDUCE_TOKENS:
+                    groups.append(current)
+                    current, tokens = [], 0
+                current.append(summary)
+                tokens += summary_tokens
+            groups.append(current)
+            if len(groups) == 1:
+                return self._combine(file_name, groups[0])
+            summaries = [self._combine(file_name, group) for group in groups]
+        return summaries[0] if summaries else ""
+
+    def summarize(self, file_name: str, file_hash: str, pieces: Iterable[Tuple[int, str]]) -> Dict[str, Any]:
+        """Resume un documento a partir de sus fragmentos (página, texto) en orden de lectura y lo guarda"""
+        start_time = time.time()
+        sections = []
+        inflight = deque()
+
+        # Sections are summarized concurrently while the next ones are still being read
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="summarize") as executor:
+            for first_page, last_page, text in self._sections(pieces):
+                if len(inflight) >= 2 * self.max_workers:
+                    sections.append(self._collect(inflight.popleft()))
+                inflight.append((first_page, last_page, executor.submit(
+                    self._summarize_section, file_name, first_page, last_page, text
+                )))
+            while inflight:
+                sections.append(self._collect(inflight.popleft()))
+
+        data = {
+            'file_hash': file_hash,
+            'name': file_name,
+            'model': self.model,
+            'sections': sections,
+            'summary': self._reduce(file_name, [section['summary'] for section in sections]),
+            'created': time.time()
+        }
+        self.store.put(file_hash, data)
+        print(f"[DEBUG] Summarized {file_name} ({len(sections)} sections) in {time.time() - start_time:.2f} seconds")
+        return data
+
+    @staticmethod
+    def _collect(item) -> Dict[str, Any]:
+        first_page, last_page, future = item
+        return {'pages': [first_page, last_page], 'summary': future.result()}
+
+
+_shared_store: Optional[SummaryStore] = None
+_shared_store_lock = threading.Lock()
+
+
+def get_summary_store() -> SummaryStore:
+    """Devuelve el almacén de resúmenes compartido por el proceso"""
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            _shared_store = SummaryStore()
+        return _shared_store
+
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_summary_pool() -> ThreadPoolExecutor:
+    """Devuelve el pool compartido que resume los documentos después de activar el corpus"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=SUMMARY_BACKGROUND_WORKERS, thread_name_prefix="summaries")
+        return _pool
@@ -0,0 +1,43 @@
+import os
+import threading
+from typing import List, Optional
+import tiktoken
+
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "cl100k_base")
+CHARS_PER_TOKEN = 4
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def get_encoding() -> Optional["tiktoken.Encoding"]:
+    """Devuelve el tokenizador compartido, o None si no se pudo cargar"""
+    global _encoding, _encoding_loaded
+    with _encoding_lock:
+        if not _encoding_loaded:
+            try:
+                _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+            except Exception as e:
+                # tiktoken downloads its BPE files on first use; offline hosts fall back to an estimate
+                print(f"[DEBUG] Could not load tokenizer {TOKENIZER_ENCODING}, estimating tokens: {e}")
+                _encoding = None
+            _encoding_loaded = True
+        return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Cuenta los tokens de un texto"""
+    encoding = get_encoding()
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def token_offsets(text: str) -> List[int]:
+    """Posición en caracteres donde empieza cada token del texto"""
+    encoding = get_encoding()
+    if encoding is None:
+        return list(range(0, len(text), CHARS_PER_TOKEN))
+    _, offsets = encoding.decode_with_offsets(encoding.encode(text, disallowed_special=()))
+    return offsets
@@ -0,0 +1,287 @@
+import os
+import threading
+from typing import List, Dict, Any, Optional, Tuple, Iterable
+import numpy as np
+from langchain.schema import Document
+from langchain_community.vectorstores import Chroma
+from services.corpus_snapshot import CorpusSnapshot, SNAPSHOT_FORMAT, open_snapshot, write_snapshot
+
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "chroma")
+FLAT_INDEX_DTYPE = os.getenv("FLAT_INDEX_DTYPE", "int8")
+FLAT_RESCORE_FACTOR = int(os.getenv("FLAT_RESCORE_FACTOR", "4"))
+FLAT_SCAN_BLOCK_ROWS = 4096
+
+
+class ChromaVectorStore(Chroma):
+    """Chroma con escritura de embeddings ya calculados, la misma interfaz que FlatVectorStore"""
+
+    def upsert_embeddings(self, ids: List[str], embeddings: List[List[float]],
+                          metadatas: List[Dict[str, Any]], documents: List[str]):
+        self._collection.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+
+    def save(self):
+        """Chroma persiste cada escritura por sí mismo"""
+
+
+def _quantize(vectors: np.ndarray, dtype: str) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+    """Scalar quantization of normalized rows; returns (matrix, per-row scales)"""
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    return None, None
+
+
+class FlatVectorStore:
+    """Índice vectorial exacto sobre matrices NumPy contiguas, con cuantización opcional.
+
+    Vectors are L2-normalized so scores are cosine similarities. With float16 or int8
+    quantization the scan runs on the compact matrix and the best candidates are
+    re-scored against the float32 vectors. Saved indexes are corpus snapshots and are
+    reopened memory-mapped, so sessions sharing a corpus share its pages.
+    """
+
+    def __init__(self, embedding_function, persist_directory: Optional[str] = None,
+                 dtype: str = FLAT_INDEX_DTYPE, rescore_factor: int = FLAT_RESCORE_FACTOR):
+        self._embedding_function = embedding_function
+        self.persist_directory = persist_directory
+        self.dtype = dtype
+        self.rescore_factor = rescore_factor
+        self._lock = threading.RLock()
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._positions: Dict[str, int] = {}
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._quantized: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        # Row buffers with spare capacity; the arrays above are views of their first rows
+        self._buffers: Optional[Tuple[np.ndarray, Optional[np.ndarray], Optional[np.ndarray]]] = None
+        self._group_rows: Dict[str, List[int]] = {}
+        self._groups: Optional[Dict[str, np.ndarray]] = {}
+        snapshot = open_snapshot(persist_directory) if persist_directory else None
+        if snapshot is not None:
+            self._load(snapshot)
+
+    @property
+    def embeddings(self):
+        return self._embedding_function
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _load(self, snapshot: CorpusSnapshot):
+        """Attach to a memory-mapped snapshot; arrays are only copied into RAM on the first mutation"""
+        self._ids = list(snapshot.ids)
+        self._documents = snapshot.texts
+        self._metadatas = list(snapshot.metadatas)
+        self._positions = {chunk_id: i for i, chunk_id in enumerate(self._ids)}
+        self._vectors = snapshot.vectors
+        if snapshot.dtype == self.dtype:
+            self._quantized, self._scales = snapshot.quantized, snapshot.scales
+        else:
+            self._quantized, self._scales = _quantize(np.asarray(self._vectors), self.dtype)
+        self._buffers = None
+        self._rebuild_groups()
+
+    def save(self):
+        """Escribe el snapshot del índice en persist_directory"""
+        with self._lock:
+            write_snapshot(
+                self.persist_directory,
+                self._ids,
+                self._documents,
+                self._metadatas,
+                np.asarray(self._vectors),
+                self.dtype,
+                self._quantized,
+                self._scales
+            )
+
+    def _rebuild_groups(self):
+        self._group_rows = {}
+        for i, metadata in enumerate(self._metadatas):
+            self._group_rows.setdefault(metadata.get('source'), []).append(i)
+        self._groups = None
+
+    def _row_groups(self) -> Dict[str, np.ndarray]:
+        """Rows of each source as arrays, rebuilt on the first search after a write"""
+        if self._groups is None:
+            self._groups = {source: np.asarray(rows, dtype=np.int64) for source, rows in self._group_rows.items()}
+        return self._groups
+
+    def _append_rows(self, vectors: np.ndarray):
+        """Append normalized rows, quantizing only the new ones; buffers grow geometrically"""
+        count, added = len(self._ids) - len(vectors), len(vectors)
+        quantized, scales = _quantize(vectors, self.dtype)
+        capacity = len(self._buffers[0]) if self._buffers is not None else 0
+        if count + added > capacity:
+            # Also the first write after loading a snapshot: its memory-mapped rows are copied here
+            capacity = max(count + added, 2 * capacity, 1024)
+            buffers = []
+            for current, new in ((self._vectors, vectors), (self._quantized, quantized), (self._scales, scales)):
+                if new is None:
+                    buffers.append(None)
+                    continue
+                buffer = np.empty((capacity,) + new.shape[1:], dtype=new.dtype)
+                if count:
+                    buffer[:count] = current[:count]
+                buffers.append(buffer)
+            self._buffers = tuple(buffers)
+        vector_buffer, quantized_buffer, scales_buffer = self._buffers
+        vector_buffer[count:count + added] = vectors
+        self._vectors = vector_buffer[:count + added]
+        if quantized_buffer is not None:
+            quantized_buffer[count:count + added] = quantized
+            self._quantized = quantized_buffer[:count + added]
+        if scales_buffer is not None:
+            scales_buffer[count:count + added] = scales
+            self._scales = scales_buffer[:count + added]
+
+    def upsert_embeddings(self, ids: List[str], embeddings: List[List[float]],
+                          metadatas: List[Dict[str, Any]], documents: List[str]):
+        """Inserta o reemplaza fragmentos con sus embeddings ya calculados"""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1.0, norms)
+
+        with self._lock:
+            existing = [i for i, chunk_id in enumerate(ids) if chunk_id in self._positions]
+            if existing:
+                self.delete([ids[i] for i in existing])
+
+            if not isinstance(self._documents, list):
+                self._documents = list(self._documents)
+            for chunk_id, metadata, document in zip(ids, metadatas, documents):
+                self._positions[chunk_id] = len(self._ids)
+                self._group_rows.setdefault(metadata.get('source'), []).append(len(self._ids))
+                self._ids.append(chunk_id)
+                self._metadatas.append(dict(metadata))
+                self._documents.append(document)
+            self._groups = None
+            self._append_rows(vectors)
+
+    def delete(self, ids: Iterable[str]):
+        """Elimina fragmentos por ID"""
+        with self._lock:
+            remove = {self._positions[chunk_id] for chunk_id in ids if chunk_id in self._positions}
+            if not remove:
+                return
+            keep = np.asarray([i for i in range(len(self._ids)) if i not in remove], dtype=np.int64)
+            self._ids = [self._ids[i] for i in keep]
+            self._documents = [self._documents[i] for i in keep]
+            self._metadatas = [self._metadatas[i] for i in keep]
+            self._positions = {chunk_id: i for i, chunk_id in enumerate(self._ids)}
+            # Quantization is per row, so the kept rows keep their quantized values
+            self._vectors = np.ascontiguousarray(self._vectors[keep], dtype=np.float32)
+            if self._quantized is not None:
+                self._quantized = np.ascontiguousarray(self._quantized[keep])
+            if self._scales is not None:
+                self._scales = np.ascontiguousarray(self._scales[keep])
+            self._buffers = None
+            self._rebuild_groups()
+
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Misma forma que Chroma.get: {'ids', 'documents', 'metadatas'}"""
+        include = include or ["documents", "metadatas"]
+        with self._lock:
+            rows = range(len(self._ids)) if ids is None else [self._positions[i] for i in ids if i in self._positions]
+            return {
+                'ids': [self._ids[i] for i in rows],
+                'documents': [self._documents[i] for i in rows] if "documents" in include else None,
+                # Copies, like Chroma: the stored dicts may belong to a snapshot shared by every session
+                'metadatas': [dict(self._metadatas[i]) for i in rows] if "metadatas" in include else None
+            }
+
+    def _query_vector(self, embedding: List[float]) -> np.ndarray:
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        return query / norm if norm else query
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        """Approximate scores for every row in one matrix-vector product"""
+        if self._quantized is None:
+            return self._vectors @ query
+        # NumPy has no BLAS kernel for float16/int8, so blocks are widened to float32 on the fly
+        scores = np.empty(len(self._quantized), dtype=np.float32)
+        for start in range(0, len(scores), FLAT_SCAN_BLOCK_ROWS):
+            block = self._quantized[start:start + FLAT_SCAN_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+        if self._scales is not None:
+            scores *= self._scales
+        return scores
+
+    def _top_k(self, scores: np.ndarray, rows: np.ndarray, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """Exact top-k among `rows`, re-scoring quantized candidates with the float32 vectors"""
+        if len(rows) == 0 or k <= 0:
+            return []
+        candidates = k if self._quantized is None else min(len(rows), k * self.rescore_factor)
+        subset = scores[rows]
+        if candidates < len(rows):
+            best = np.argpartition(-subset, candidates - 1)[:candidates]
+            rows, subset = rows[best], subset[best]
+        if self._quantized is not None:
+            # Sorted rows read the (possibly memory-mapped) float32 matrix sequentially
+            rows = np.sort(rows)
+            subset = np.asarray(self._vectors[rows]) @ query
+        order = np.argsort(-subset)[:k]
+        return [(int(rows[i]), float(subset[i])) for i in order]
+
+    def _document(self, row: int) -> Document:
+        return Document(page_content=self._documents[row], metadata=dict(self._metadatas[row]))
+
+    def _rows_for(self, filter: Optional[Dict[str, Any]]) -> np.ndarray:
+        if not filter:
+            return np.arange(len(self._ids))
+        if set(filter) == {"source"}:
+            return self._row_groups().get(filter["source"], np.zeros(0, dtype=np.int64))
+        return np.asarray([
+            i for i, metadata in enumerate(self._metadatas)
+            if all(metadata.get(key) == value for key, value in filter.items())
+        ], dtype=np.int64)
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding: List[float], k: int = 4,
+                                                          filter: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            if not self._ids:
+                return []
+            query = self._query_vector(embedding)
+            return [(self._document(row), score)
+                    for row, score in self._top_k(self._scores(query), self._rows_for(filter), query, k)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4,
+                                    filter: Optional[Dict[str, Any]] = None) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_relevance_scores(embedding, k, filter)]
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None) -> List[Document]:
+        return self.similarity_search_by_vector(self._embedding_function.embed_query(query), k, filter)
+
+    def grouped_search(self, embedding: List[float], k: int,
+                       sources: Optional[List[str]] = None) -> Dict[str, List[Tuple[Document, float]]]:
+        """Top-k exacto por documento con un solo producto matriz-vector"""
+        with self._lock:
+            if not self._ids:
+                return {}
+            query = self._query_vector(embedding)
+            scores = self._scores(query)
+            return {
+                source: [(self._document(row), score) for row, score in self._top_k(scores, rows, query, k)]
+                for source, rows in self._row_groups().items()
+                if sources is None or source in sources
+            }
+
+
+def vector_store_signature() -> str:
+    """Identifica el formato del store, para la huella del corpus"""
+    if VECTOR_STORE_BACKEND == "flat":
+        return f"flat:{FLAT_INDEX_DTYPE}:snapshot{SNAPSHOT_FORMAT}"
+    return "chroma"
+
+
+def open_vector_store(embeddings, persist_directory: str):
+    """Abre (o crea) el store del backend configurado en VECTOR_STORE_BACKEND ("chroma" o "flat")"""
+    if VECTOR_STORE_BACKEND == "flat":
+        return FlatVectorStore(embeddings, persist_directory)
+    return ChromaVectorStore(embedding_function=embeddings, persist_directory=persist_directory)